@@ -0,0 +1,232 @@
+"""
+Benchmark hors-ligne du chemin de recherche (/ruling, /ruling_search).
+
+    python bench.py                                  # index mémoire, corpus 1k/10k/100k
+    python bench.py --sizes 1000 --queries 2000
+    python bench.py --backend postgres --database-url postgresql://localhost/ygo_bench
+
+Génère des corpus synthétiques dans l'esprit de expand_seed_to_100(), rejoue un
+mélange de requêtes réalistes (keys exactes, partielles, fautes de frappe,
+archetypes, requêtes sans résultat) contre db_find_ruling / db_search_rulings,
+puis écrit débit et percentiles par classe de requêtes dans bench_results/.
+"""
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import asyncio
+import platform
+import subprocess
+from typing import List, Dict, Any, Tuple
+
+QUERY_MIX = [
+    ("exact", 0.40),
+    ("partial", 0.20),
+    ("typo", 0.20),
+    ("archetype", 0.10),
+    ("miss", 0.10),
+]
+
+EXTRA_ARCHETYPES = [
+    "sky striker", "dragon link", "mathmech", "eldlich", "drytron", "virtual world", "dogmatika",
+    "adventurer", "phantom knights", "salamangreat", "unchained", "purrely", "kashtira", "voiceless voice",
+    "yubel", "fiendsmith", "centur-ion", "memento", "ryzeal", "maliss",
+]
+
+CARD_WORDS = [
+    "dragon", "knight", "fusion", "ritual", "synchro", "xyz", "link", "pendulum", "striker", "maiden",
+    "oracle", "sentinel", "warden", "herald", "beast", "wyrm", "spell", "trap", "chain", "mirror",
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark du chemin de recherche")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="tailles de corpus, séparées par des virgules")
+    parser.add_argument("--queries", type=int, default=5000, help="requêtes rejouées par corpus et par fonction")
+    parser.add_argument("--backend", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="Postgres local (backend postgres); les tables sont créées dans le schéma `bench`")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results")
+    return parser.parse_args()
+
+ARGS = parse_args()
+# main.py exige DATABASE_URL à l'import; le backend mémoire n'ouvre aucune connexion.
+os.environ.setdefault("DATABASE_URL", ARGS.database_url or "postgresql://localhost/ygo_bench")
+
+import asyncpg  # noqa: E402
+import main  # noqa: E402
+
+def synthetic_rulings(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Étend expand_seed_to_100() jusqu'à n entrées (mêmes gabarits, plus d'archetypes et de cartes)."""
+    out = list(main.expand_seed_to_100())
+    templates = [
+        ("combo starter", "Starter", "Entrée de base: rôle du starter et comment l’interrompre.", ["competitive", "combo"]),
+        ("choke point", "Choke point", "Choke point: l’interruption qui a le plus d’impact sur la ligne.", ["competitive", "interaction"]),
+        ("resource loop", "Resource loop", "Boucle de ressources: récupération depuis GY/banish.", ["competitive", "grind"]),
+        ("endboard", "Endboard", "Endboard: types de négations/interruptions établies.", ["competitive", "board"]),
+        ("side tips", "Side tips", "Conseils side: cartes efficaces contre ce plan.", ["competitive", "side"]),
+        ("card ruling", "Ruling", "Ruling de carte: timing, coût et conditions d’activation.", ["card", "ruling"]),
+    ]
+    archetypes = sorted(set(EXTRA_ARCHETYPES) | {r["archetype"] for r in out if r.get("archetype")})
+    i = 1
+    while len(out) < n:
+        arch = archetypes[(i - 1) % len(archetypes)]
+        name, title, content, tags = templates[(i - 1) % len(templates)]
+        if name == "card ruling":
+            card = " ".join(rng.sample(CARD_WORDS, 2))
+            name = f"{card}"
+            title = f"{arch.title()} {card.title()}"
+        out.append({
+            "key": f"{arch} {name} {i}",
+            "title": f"{arch.title()} — {title}",
+            "content": f"{arch.title()}: {content}",
+            "tags": tags + [arch],
+            "archetype": arch,
+            "format": rng.choice(["tcg", "ocg", "masterduel"]),
+        })
+        i += 1
+    return out[:n]
+
+def typo(s: str, rng: random.Random) -> str:
+    if len(s) < 3:
+        return s + rng.choice(string.ascii_lowercase)
+    i = rng.randrange(len(s) - 1)
+    op = rng.choice(["drop", "swap", "replace", "insert"])
+    if op == "drop":
+        return s[:i] + s[i + 1:]
+    if op == "swap":
+        return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+    if op == "replace":
+        return s[:i] + rng.choice(string.ascii_lowercase) + s[i + 1:]
+    return s[:i] + rng.choice(string.ascii_lowercase) + s[i:]
+
+def make_queries(corpus: List[Dict[str, Any]], n: int, rng: random.Random) -> List[Tuple[str, str]]:
+    keys = [main.norm_key(r["key"]) for r in corpus]
+    archetypes = sorted({r["archetype"] for r in corpus if r.get("archetype")})
+    classes = [c for c, _ in QUERY_MIX]
+    weights = [w for _, w in QUERY_MIX]
+    out = []
+    for cls in rng.choices(classes, weights, k=n):
+        key = rng.choice(keys)
+        if cls == "exact":
+            q = key
+        elif cls == "partial":
+            words = key.split()
+            q = " ".join(words[:rng.randint(1, max(1, len(words) - 1))])
+        elif cls == "typo":
+            q = typo(key, rng)
+        elif cls == "archetype":
+            q = rng.choice(archetypes)
+        else:
+            q = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        out.append((cls, q))
+    return out
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    data = sorted(samples)
+    total = sum(data)
+
+    def pct(p: float) -> float:
+        return data[min(len(data) - 1, int(p / 100 * len(data)))] * 1000
+
+    return {
+        "count": len(data),
+        "qps": len(data) / total if total else 0.0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": data[-1] * 1000,
+    }
+
+async def load_memory(corpus: List[Dict[str, Any]]):
+    # même chemin que le bot (db_load_index): construction par paquets puis échange
+    await main.ruling_index.rebuild([dict(zip(main.RULING_COLUMNS, main.ruling_record(r))) for r in corpus])
+
+async def load_postgres(corpus: List[Dict[str, Any]]):
+    if main.pool is None:
+        main.pool = await asyncpg.create_pool(
+            ARGS.database_url, min_size=1, max_size=4, server_settings={"search_path": "bench"}
+        )
+        async with main.pool.acquire() as con:
+            await con.execute("CREATE SCHEMA IF NOT EXISTS bench;")
+        await main.db_init()
+    async with main.pool.acquire() as con:
+        await con.execute("TRUNCATE rulings;")
+        await main.db_bulk_upsert_rulings(con, [main.ruling_record(r) for r in corpus])
+        await con.execute("ANALYZE rulings;")
+    # force le chemin SQL
+    main.ruling_index.ready = False
+
+async def replay(fn_name: str, queries: List[Tuple[str, str]]) -> Dict[str, Dict[str, float]]:
+    fn = {"db_find_ruling": main.db_find_ruling, "db_search_rulings": main.db_search_rulings}[fn_name]
+    by_class: Dict[str, List[float]] = {}
+    for cls, q in queries:
+        t0 = time.perf_counter()
+        await fn(q)
+        by_class.setdefault(cls, []).append(time.perf_counter() - t0)
+    report = {cls: summarize(samples) for cls, samples in sorted(by_class.items())}
+    report["all"] = summarize([s for samples in by_class.values() for s in samples])
+    return report
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_report(size: int, fn_name: str, report: Dict[str, Dict[str, float]]):
+    print(f"\n{fn_name} — {size} rulings")
+    print(f"  {'classe':<10} {'n':>6} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for cls, r in report.items():
+        print(f"  {cls:<10} {r['count']:>6} {r['qps']:>10.0f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+
+async def run():
+    if ARGS.backend == "postgres" and not ARGS.database_url:
+        raise SystemExit("--database-url (ou BENCH_DATABASE_URL) est requis pour le backend postgres")
+    # le cache de résultats masquerait le coût réel de la recherche
+    main.result_cache.maxsize = 0
+    main.result_cache.clear()
+
+    sizes = [int(x) for x in ARGS.sizes.split(",") if x.strip()]
+    results: Dict[str, Any] = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "backend": ARGS.backend,
+        "queries": ARGS.queries,
+        "query_mix": dict(QUERY_MIX),
+        "seed": ARGS.seed,
+        "corpora": {},
+    }
+    try:
+        for size in sizes:
+            rng = random.Random(ARGS.seed + size)
+            corpus = synthetic_rulings(size, rng)
+            t0 = time.perf_counter()
+            await (load_memory(corpus) if ARGS.backend == "memory" else load_postgres(corpus))
+            load_s = time.perf_counter() - t0
+            print(f"\n== Corpus {size} rulings (chargement {load_s:.2f} s)")
+            queries = make_queries(corpus, ARGS.queries, rng)
+            entry: Dict[str, Any] = {"load_seconds": load_s}
+            for fn_name in ("db_find_ruling", "db_search_rulings"):
+                entry[fn_name] = await replay(fn_name, queries)
+                print_report(size, fn_name, entry[fn_name])
+            results["corpora"][str(size)] = entry
+    finally:
+        if main.pool is not None:
+            await main.pool.close()
+
+    os.makedirs(ARGS.out, exist_ok=True)
+    path = os.path.join(ARGS.out, f"{time.strftime('%Y%m%d-%H%M%S')}-{ARGS.backend}-{results['version']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Résultats: {path}")
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -1,8 +1,22 @@
 import os
 import re
+import sys
+import json
+import hashlib
+import argparse
+import time
+import heapq
+import zlib
+import random
+import bisect
 import difflib
+import signal
+import functools
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+from array import array
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Set, Iterable
 
 import discord
 from discord.ext import commands
@@ -13,15 +27,70 @@ import asyncpg
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DISCORD_TOKEN:
-    raise RuntimeError("DISCORD_TOKEN manquant (Railway > Variables).")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL manquant (Railway > Add PostgreSQL puis Variables auto).")
 
+def parse_id_ranges(spec: str, max_count: Optional[int] = None) -> List[int]:
+    """"0-3,6" -> [0, 1, 2, 3, 6]; ValueError si mal formé ou plus de `max_count` IDs."""
+    out: List[int] = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            r = range(int(a), int(b) + 1)
+        else:
+            r = range(int(part), int(part) + 1)
+        if max_count is not None and len(out) + len(r) > max_count:
+            raise ValueError(f"plus de {max_count} IDs")
+        out.extend(r)
+    return sorted(set(out))
+
+def format_id_ranges(ids: Iterable[int]) -> str:
+    """[1, 2, 3, 6] -> "1-3, 6" """
+    parts: List[str] = []
+    run: List[int] = []
+    for i in sorted(ids):
+        if run and i != run[-1] + 1:
+            parts.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else str(run[0]))
+            run = []
+        run.append(i)
+    if run:
+        parts.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else str(run[0]))
+    return ", ".join(parts)
+
+# Sharding: SHARD_COUNT / SHARD_IDS sont posés par le superviseur (python main.py supervise),
+# AUTO_SHARD=1 laisse Discord choisir le nombre de shards dans un seul process.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = parse_id_ranges(os.getenv("SHARD_IDS", "")) or None
+AUTO_SHARD = os.getenv("AUTO_SHARD", "0") == "1"
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "5"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "10")) or None
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "5")) or None
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300"))
+# Si défini, le superviseur répartit ce total de connexions entre ses workers.
+DB_POOL_MAX_TOTAL = int(os.getenv("DB_POOL_MAX_TOTAL", "0"))
+
+if SHARD_IDS and not SHARD_COUNT:
+    raise RuntimeError("SHARD_IDS demande aussi SHARD_COUNT.")
+
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT or AUTO_SHARD:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents,
+        shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, enable_debug_events=True
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, enable_debug_events=True)
 
 pool: Optional[asyncpg.Pool] = None
+# Levé par startup() quand le schéma est prêt: le bot se connecte à Discord en parallèle.
+db_ready = asyncio.Event()
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", "20"))
 
 # ----------------------------
 # Seed : base compétitive (exemples)
@@ -131,8 +200,6 @@ def expand_seed_to_100() -> List[Dict[str, Any]]:
 
     return out[:100]
 
-SEED_100 = expand_seed_to_100()
-
 # ----------------------------
 # Utilitaires
 # ----------------------------
@@ -148,14 +215,773 @@ def str_to_tags(s: Optional[str]) -> List[str]:
     return [t.strip().lower() for t in s.split(",") if t.strip()]
 
 def is_admin(inter: discord.Interaction) -> bool:
-    return bool(inter.user and inter.user.guild_permissions.administrator)
+    # en DM, inter.user est un discord.User (pas de guild_permissions)
+    return isinstance(inter.user, discord.Member) and inter.user.guild_permissions.administrator
+
+def rec_to_dict(rec: asyncpg.Record) -> Dict[str, Any]:
+    return {
+        "key": rec["key"],
+        "title": rec["title"],
+        "content": rec["content"],
+        "tags": str_to_tags(rec["tags"]),
+        "archetype": rec["archetype"],
+        "format": rec["format"]
+    }
+
+# ----------------------------
+# Index mémoire (recherche sans ILIKE)
+# ----------------------------
+def trigrams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+SUGGEST_CUTOFF = 0.55
+
+def difflib_ratio(matches: int, length: int) -> float:
+    # même formule que difflib (_calculate_ratio): les comparaisons au cutoff tombent pareil
+    return 2.0 * matches / length if length else 1.0
+
+def bit_slots(x: int) -> Iterable[int]:
+    """Positions des bits à 1 de x (numéros de slot)."""
+    s = bin(x)[:1:-1]
+    i = s.find("1")
+    while i >= 0:
+        yield i
+        i = s.find("1", i + 1)
+
+class KeySuggester:
+    """
+    Remplace difflib.get_close_matches(q, toutes_les_keys, n=5, cutoff=0.55), avec
+    le même résultat (même score, même cutoff, même ordre) quel que soit le nombre de keys.
+    Chaque key occupe un slot; pour chaque caractère c et chaque j, un bitset des slots
+    dont la key contient au moins j fois c, et un bitset par longueur de key.
+    Additionner les bitsets des caractères de q (compteur "bit-slice") donne, pour toutes
+    les keys à la fois, le nombre de caractères communs, c.-à-d. quick_ratio(), qui majore ratio().
+    Les keys sont ensuite évaluées par borne décroissante (longueur, caractères communs) et
+    on s'arrête dès que la borne passe sous le 5e meilleur score: SequenceMatcher ne voit
+    qu'une poignée de candidats, sans perdre l'exactitude.
+    """
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self.free: List[int] = []
+        self.lengths: Counter = Counter()
+        # ("", longueur) ou (caractère, j) -> bitset; bytearray pour les écritures, int pour les calculs
+        self.bits: Dict[Tuple[str, int], bytearray] = {}
+        self.ints: Dict[Tuple[str, int], int] = {}
+
+    @staticmethod
+    def _features(key: str) -> List[Tuple[str, int]]:
+        out = [("", len(key))]
+        for c, n in Counter(key).items():
+            out += [(c, j) for j in range(1, n + 1)]
+        return out
+
+    def _set(self, feature: Tuple[str, int], slot: int, on: bool):
+        ba = self.bits.setdefault(feature, bytearray())
+        i = slot >> 3
+        if i >= len(ba):
+            ba.extend(bytes(i + 1 - len(ba)))
+        if on:
+            ba[i] |= 1 << (slot & 7)
+        else:
+            ba[i] &= ~(1 << (slot & 7))
+        self.ints.pop(feature, None)
+
+    def _bitset(self, feature: Tuple[str, int]) -> int:
+        x = self.ints.get(feature)
+        if x is None:
+            ba = self.bits.get(feature)
+            x = self.ints[feature] = int.from_bytes(ba, "little") if ba else 0
+        return x
+
+    def add(self, key: str):
+        if key in self.slots:
+            return
+        slot = self.free.pop() if self.free else len(self.names)
+        if slot == len(self.names):
+            self.names.append(key)
+        else:
+            self.names[slot] = key
+        self.slots[key] = slot
+        self.lengths[len(key)] += 1
+        for f in self._features(key):
+            self._set(f, slot, True)
+
+    def remove(self, key: str):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.names[slot] = None
+        self.free.append(slot)
+        self.lengths[len(key)] -= 1
+        if not self.lengths[len(key)]:
+            del self.lengths[len(key)]
+        for f in self._features(key):
+            self._set(f, slot, False)
+
+    def clear(self):
+        self.slots.clear()
+        self.names.clear()
+        self.free.clear()
+        self.lengths.clear()
+        self.bits.clear()
+        self.ints.clear()
+
+    def _common_counts(self, q: str) -> List[int]:
+        """planes[b] = bitset des slots dont le nombre de caractères communs avec q a le bit b à 1."""
+        planes: List[int] = []
+        for c, n in Counter(q).items():
+            for j in range(1, n + 1):
+                carry = self._bitset((c, j))
+                b = 0
+                while carry:
+                    if b == len(planes):
+                        planes.append(carry)
+                        break
+                    planes[b], carry = planes[b] ^ carry, planes[b] & carry
+                    b += 1
+        return planes
+
+    def suggest(self, q: str, n: int = 5, cutoff: float = SUGGEST_CUTOFF) -> List[str]:
+        lq = len(q)
+        planes = self._common_counts(q)
+        top = 1 << len(planes)
+        # par longueur de key: nombre minimal de caractères communs pour quick_ratio() >= cutoff
+        # (les longueurs qui échouent real_quick_ratio() sont écartées d'emblée)
+        need: Dict[int, int] = {}
+        rest: Dict[int, int] = {}
+        for length in self.lengths:
+            if difflib_ratio(min(lq, length), lq + length) < cutoff:
+                continue
+            m = 0
+            while difflib_ratio(m, lq + length) < cutoff:
+                m += 1
+            if m >= top:
+                continue
+            # slots de cette longueur dont le compteur >= m
+            eq, gt = self._bitset(("", length)), 0
+            for b in range(len(planes) - 1, -1, -1):
+                if m >> b & 1:
+                    eq &= planes[b]
+                else:
+                    gt |= eq & planes[b]
+                    eq &= ~planes[b]
+            if gt | eq:
+                need[length], rest[length] = m, gt | eq
+        levels = sorted(
+            ((difflib_ratio(m, lq + length), length, m)
+             for length, low in need.items() for m in range(min(lq, length, top - 1), low - 1, -1)),
+            reverse=True,
+        )
+
+        sm = difflib.SequenceMatcher()
+        sm.set_seq2(q)
+        best: List[Tuple[float, str]] = []
+        for bound, length, m in levels:
+            if len(best) == n and bound < best[0][0]:
+                break
+            hit = rest[length]
+            if not hit:
+                continue
+            for b, p in enumerate(planes):
+                hit &= p if m >> b & 1 else ~p
+            if not hit:
+                continue
+            rest[length] &= ~hit
+            for slot in bit_slots(hit):
+                k = self.names[slot]
+                sm.set_seq1(k)
+                score = sm.ratio()
+                if score >= cutoff:
+                    if len(best) < n:
+                        heapq.heappush(best, (score, k))
+                    else:
+                        heapq.heappushpop(best, (score, k))
+        return [k for _, k in sorted(best, reverse=True)]
+
+# Nombre max de candidats examinés par frappe (Discord coupe l'autocomplete au-delà de ~3 s)
+AUTOCOMPLETE_SCAN_MAX = 500
+# rechargement complet de l'index: rulings indexés entre deux rendus de la main à la boucle
+INDEX_BUILD_CHUNK = int(os.getenv("INDEX_BUILD_CHUNK", "500"))
+
+class KeyCompleter:
+    """
+    Tableau trié de (terme, key) où terme = key ou titre normalisé.
+    Sert l'autocomplete par préfixe (bisect) sans toucher à la base.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str]] = []
+        # chargement en masse: entrées accumulées puis triées une fois (end_batch)
+        self.batch: Optional[List[Tuple[str, str]]] = None
+
+    @staticmethod
+    def _terms(key: str, title: str) -> Set[str]:
+        return {key, norm_key(title or "")} - {""}
+
+    def begin_batch(self):
+        self.batch = []
+
+    def end_batch(self):
+        batch, self.batch = self.batch or [], None
+        entries = list(set(self.entries).union(batch))
+        # deux tris stables sur des str: même ordre que les tuples, nettement plus rapide
+        entries.sort(key=lambda e: e[1])
+        entries.sort(key=lambda e: e[0])
+        self.entries = entries
+
+    def add(self, key: str, title: str):
+        if self.batch is not None:
+            self.batch.extend((t, key) for t in self._terms(key, title))
+            return
+        for t in self._terms(key, title):
+            entry = (t, key)
+            i = bisect.bisect_left(self.entries, entry)
+            if i == len(self.entries) or self.entries[i] != entry:
+                self.entries.insert(i, entry)
+
+    def remove(self, key: str, title: str):
+        for t in self._terms(key, title):
+            i = bisect.bisect_left(self.entries, (t, key))
+            if i < len(self.entries) and self.entries[i] == (t, key):
+                del self.entries[i]
+
+    def clear(self):
+        self.entries.clear()
+
+    def prefix(self, q: str, cap: int) -> Set[str]:
+        out: Set[str] = set()
+        i = bisect.bisect_left(self.entries, (q, ""))
+        while i < len(self.entries) and len(out) < cap and self.entries[i][0].startswith(q):
+            out.add(self.entries[i][1])
+            i += 1
+        return out
+
+def posting_add(index: Dict[str, Set[str]], term: str, key: str):
+    index.setdefault(term, set()).add(key)
+
+def posting_discard(index: Dict[str, Set[str]], term: str, key: str):
+    posting = index.get(term)
+    if posting is not None:
+        posting.discard(key)
+        if not posting:
+            del index[term]
+
+class RulingIndex:
+    """
+    Copie mémoire de la table rulings + index inversés:
+      - trigrammes de key / title (recherche en sous-chaîne, insensible à la casse)
+      - tag, archetype et format en égalité (mêmes filtres que tag_list / archetype / format en SQL)
+    Construit au startup(), tenu à jour par rulings_changed() après chaque écriture.
+    """
+
+    def __init__(self):
+        self.rulings: Dict[str, Dict[str, Any]] = {}
+        self.haystacks: Dict[str, Tuple[str, ...]] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.by_tag: Dict[str, Set[str]] = {}
+        self.by_archetype: Dict[str, Set[str]] = {}
+        self.by_format: Dict[str, Set[str]] = {}
+        self.suggester = KeySuggester()
+        self.completer = KeyCompleter()
+        self.ready = False
+        # pendant rebuild(): dernières versions reçues, à rejouer sur le nouvel index
+        self.replay: Optional[Dict[str, Optional[asyncpg.Record]]] = None
+
+    def __len__(self) -> int:
+        return len(self.rulings)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.rulings.get(key)
+
+    def load(self, records: Iterable[asyncpg.Record]):
+        for index in (self.rulings, self.haystacks, self.grams, self.by_tag, self.by_archetype, self.by_format):
+            index.clear()
+        self.suggester.clear()
+        self.completer.clear()
+        for rec in records:
+            self.upsert(rec)
+        self.ready = True
+
+    async def rebuild(self, records: List[asyncpg.Record]):
+        """
+        Comme load(), mais construit un nouvel index par paquets (la boucle reste libre)
+        puis l'échange d'un coup. Les upsert/remove reçus pendant la construction
+        (change feed, commandes) sont rejoués sur le nouvel index avant l'échange.
+        """
+        fresh = RulingIndex()
+        self.replay = {}
+        try:
+            fresh.completer.begin_batch()
+            for i, rec in enumerate(records, 1):
+                fresh.upsert(rec)
+                if i % INDEX_BUILD_CHUNK == 0:
+                    await asyncio.sleep(0)
+            fresh.completer.end_batch()
+            for key, rec in self.replay.items():
+                if rec is not None:
+                    fresh.upsert(rec)
+                else:
+                    fresh.remove(key)
+        finally:
+            self.replay = None
+        for name in ("rulings", "haystacks", "grams", "by_tag", "by_archetype", "by_format", "suggester", "completer"):
+            setattr(self, name, getattr(fresh, name))
+        self.ready = True
+
+    def _terms(self, r: Dict[str, Any]):
+        yield self.by_tag, r["tags"]
+        yield self.by_archetype, [(r["archetype"] or "").lower()]
+        yield self.by_format, [(r["format"] or "").lower()]
+
+    def upsert(self, rec: asyncpg.Record):
+        key = rec["key"]
+        self.drop(key)
+        if self.replay is not None:
+            self.replay[key] = rec
+        r = rec_to_dict(rec)
+        hay = (key.lower(), (r["title"] or "").lower())
+        self.rulings[key] = r
+        self.haystacks[key] = hay
+        self.suggester.add(key)
+        self.completer.add(key, r["title"])
+        for g in set().union(*(trigrams(h) for h in hay)):
+            posting_add(self.grams, g, key)
+        for index, terms in self._terms(r):
+            for t in terms:
+                if t:
+                    posting_add(index, t, key)
+
+    def remove(self, key: str):
+        self.drop(key)
+        if self.replay is not None:
+            self.replay[key] = None
+
+    def drop(self, key: str):
+        if key not in self.rulings:
+            return
+        r = self.rulings.pop(key)
+        hay = self.haystacks.pop(key)
+        self.suggester.remove(key)
+        self.completer.remove(key, r["title"])
+        for g in set().union(*(trigrams(h) for h in hay)):
+            posting_discard(self.grams, g, key)
+        for index, terms in self._terms(r):
+            for t in terms:
+                posting_discard(index, t, key)
+
+    def match_set(self, q: str) -> Set[str]:
+        """Keys dont key/title contient q, ou dont un tag / l'archetype vaut q."""
+        grams = trigrams(q)
+        if grams:
+            postings = sorted((self.grams.get(g, set()) for g in grams), key=len)
+            candidates = set(postings[0])
+            for p in postings[1:]:
+                if not candidates:
+                    break
+                candidates &= p
+        else:
+            # requête < 3 caractères: pas de trigramme, on parcourt tout
+            candidates = self.haystacks.keys()
+        found = {k for k in candidates if any(q in h for h in self.haystacks[k])}
+        found |= self.by_tag.get(q, set())
+        found |= self.by_archetype.get(q, set())
+        return found
+
+    def match(self, q: str, limit: int) -> List[str]:
+        """Keys correspondant à q, triées, max `limit`."""
+        return heapq.nsmallest(limit, self.match_set(q))
+
+    def filter_set(self, tag: Optional[str], archetype: Optional[str], format: Optional[str]) -> Optional[Set[str]]:
+        """Intersection des filtres demandés (None si aucun filtre)."""
+        out: Optional[Set[str]] = None
+        for index, term in ((self.by_tag, tag), (self.by_archetype, archetype), (self.by_format, format)):
+            if term:
+                posting = index.get(term, set())
+                out = set(posting) if out is None else out & posting
+        return out
+
+    def search(self, q: str, limit: int, tag: Optional[str] = None, archetype: Optional[str] = None,
+               format: Optional[str] = None, after: Optional[str] = None) -> List[str]:
+        """Keys triées, max `limit`, strictement après `after` (pagination par curseur)."""
+        keys = self.filter_set(tag, archetype, format)
+        if q:
+            keys = self.match_set(q) if keys is None else keys & self.match_set(q)
+        keys = keys or ()
+        if after is not None:
+            keys = [k for k in keys if k > after]
+        return heapq.nsmallest(limit, keys)
+
+    def suggest(self, q: str) -> List[str]:
+        return self.suggester.suggest(q)
+
+    def complete(self, q: str, popularity: Dict[str, int], limit: int = 25) -> List[str]:
+        """
+        Keys pour l'autocomplete: préfixe de key/titre d'abord, puis sous-chaîne,
+        chaque groupe trié par popularité (/ruling_stats) puis par key.
+        """
+        def rank(keys: Iterable[str]) -> List[str]:
+            return sorted(keys, key=lambda k: (-popularity.get(k, 0), k))
+
+        if not q:
+            out = rank(k for k in popularity if k in self.rulings)[:limit]
+            # déploiement neuf (stats vides): on complète par ordre alphabétique des termes
+            seen = set(out)
+            for _, k in self.completer.entries:
+                if len(out) >= limit:
+                    break
+                if k not in seen:
+                    seen.add(k)
+                    out.append(k)
+            return out
+        first = rank(self.completer.prefix(q, AUTOCOMPLETE_SCAN_MAX))
+        if len(first) >= limit:
+            return first[:limit]
+        seen = set(first)
+        rest = rank(heapq.nsmallest(AUTOCOMPLETE_SCAN_MAX, self.match_set(q) - seen))
+        return (first + rest)[:limit]
+
+ruling_index = RulingIndex()
+
+# ----------------------------
+# Cache des résultats de recherche
+# ----------------------------
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+# au-delà de ce nombre de keys modifiées d'un coup (import, modération, change feed), on vide le cache
+RESULT_CACHE_BULK_INVALIDATE = int(os.getenv("RESULT_CACHE_BULK_INVALIDATE", "32"))
+
+def ruling_matches(r: Dict[str, Any], q: str, tag: Optional[str] = None,
+                   archetype: Optional[str] = None, format: Optional[str] = None) -> bool:
+    """Même prédicat que RulingIndex.search(), évalué sur un seul ruling."""
+    if tag and tag not in r["tags"]:
+        return False
+    if archetype and (r["archetype"] or "").lower() != archetype:
+        return False
+    if format and (r["format"] or "").lower() != format:
+        return False
+    if not q:
+        return True
+    return (
+        q in r["key"].lower()
+        or q in (r["title"] or "").lower()
+        or q in r["tags"]
+        or q == (r["archetype"] or "").lower()
+    )
+
+class ResultCache:
+    """
+    LRU + TTL sur les résultats de db_find_ruling / db_search_rulings,
+    clé = ("find", q) ou ("search", q, limit, tag, archetype, format, mode, after).
+    Invalidation ciblée quand un ruling change, sans parcourir tout le cache:
+      - by_key: key affichée (résultat ou suggestion) -> entrées
+      - by_pred: (q, tag, archetype, format) -> entrées, testé une fois par prédicat distinct
+      - queries / grams: requête -> entrées et trigrammes -> requêtes, pour qu'une nouvelle
+        key ne passe dans difflib que contre les requêtes qui lui ressemblent (suggestions)
+      - fulltext: entrées plein texte, dépendantes du contenu (toutes invalidées)
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: "OrderedDict[tuple, Tuple[float, Any, Set[str]]]" = OrderedDict()
+        self.by_key: Dict[str, Set[tuple]] = {}
+        self.by_pred: Dict[tuple, Set[tuple]] = {}
+        self.queries: Dict[str, Set[tuple]] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.fulltext: Set[tuple] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def pred(cache_key: tuple) -> tuple:
+        if cache_key[0] == "find":
+            return (cache_key[1], None, None, None)
+        return (cache_key[1],) + cache_key[3:6]
+
+    def get(self, cache_key: tuple) -> Optional[Any]:
+        item = self.data.get(cache_key)
+        if item is None:
+            self.misses += 1
+            return None
+        if time.monotonic() - item[0] > self.ttl:
+            self.discard(cache_key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.data.move_to_end(cache_key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, cache_key: tuple, value: Any, rulings: List[Dict[str, Any]], suggestions: List[str]):
+        if self.maxsize <= 0:
+            return
+        self.discard(cache_key)
+        keys = {r["key"] for r in rulings} | set(suggestions)
+        self.data[cache_key] = (time.monotonic(), value, keys)
+        for k in keys:
+            posting_add(self.by_key, k, cache_key)
+        if cache_key[0] == "search" and cache_key[6] == "fulltext":
+            self.fulltext.add(cache_key)
+        else:
+            posting_add(self.by_pred, self.pred(cache_key), cache_key)
+            q = cache_key[1]
+            if q:
+                if q not in self.queries:
+                    for g in KeySuggester._grams(q):
+                        posting_add(self.grams, g, q)
+                posting_add(self.queries, q, cache_key)
+        while len(self.data) > self.maxsize:
+            self.discard(next(iter(self.data)))
+            self.evictions += 1
+
+    def discard(self, cache_key: tuple):
+        item = self.data.pop(cache_key, None)
+        if item is None:
+            return
+        for k in item[2]:
+            posting_discard(self.by_key, k, cache_key)
+        if cache_key in self.fulltext:
+            self.fulltext.discard(cache_key)
+            return
+        posting_discard(self.by_pred, self.pred(cache_key), cache_key)
+        q = cache_key[1]
+        if q:
+            posting_discard(self.queries, q, cache_key)
+            if q not in self.queries:
+                for g in KeySuggester._grams(q):
+                    posting_discard(self.grams, g, q)
+
+    def clear(self):
+        for index in (self.data, self.by_key, self.by_pred, self.queries, self.grams):
+            index.clear()
+        self.fulltext.clear()
+
+    def invalidate_ruling(self, key: str, versions: List[Dict[str, Any]], added: bool = False) -> int:
+        """
+        Retire les entrées dont le résultat peut changer quand `key` passe de/à `versions`.
+        `added`: la key est nouvelle et peut entrer dans les suggestions de requêtes proches.
+        """
+        stale: Set[tuple] = set(self.by_key.get(key, ())) | self.fulltext
+        for pred, entries in self.by_pred.items():
+            if any(ruling_matches(r, *pred) for r in versions):
+                stale |= entries
+        if added:
+            sm = difflib.SequenceMatcher()
+            sm.set_seq2(key)
+            near = set().union(*(self.grams.get(g, set()) for g in KeySuggester._grams(key)))
+            for q in near:
+                sm.set_seq1(q)
+                if sm.real_quick_ratio() >= SUGGEST_CUTOFF and sm.quick_ratio() >= SUGGEST_CUTOFF \
+                        and sm.ratio() >= SUGGEST_CUTOFF:
+                    stale |= self.queries[q]
+        for ck in stale:
+            self.discard(ck)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.data), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "expired": self.expired, "invalidations": self.invalidations,
+        }
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# ----------------------------
+# Mesures de latence (par étape)
+# ----------------------------
+PERF_METRICS_PORT = int(os.getenv("PERF_METRICS_PORT", "0"))
+PERF_METRICS_HOST = os.getenv("PERF_METRICS_HOST", "127.0.0.1")
+PERF_WINDOW = int(os.getenv("PERF_WINDOW", "2048"))
+
+class LatencyHistogram:
+    """Fenêtre glissante des N dernières mesures (secondes) + percentiles à la demande."""
+
+    def __init__(self, size: int = PERF_WINDOW):
+        self.samples: deque = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentiles(self, *ps: float) -> List[float]:
+        if not self.samples:
+            return [0.0 for _ in ps]
+        data = sorted(self.samples)
+        return [data[min(len(data) - 1, int(p / 100 * len(data)))] for p in ps]
+
+class Perf:
+    """
+    Histogrammes par étape (fonctions db_*, commandes, appels Discord).
+    perf.timed("nom") décore une coroutine, perf.stage("nom") mesure un bloc.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, LatencyHistogram] = {}
+
+    def observe(self, name: str, seconds: float):
+        hist = self.stages.get(name)
+        if hist is None:
+            hist = self.stages[name] = LatencyHistogram()
+        hist.observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: Optional[str] = None):
+        def decorator(fn):
+            stage_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.observe(stage_name, time.perf_counter() - t0)
+            return wrapper
+        return decorator
+
+perf = Perf()
+
+# ----------------------------
+# DB : pool instrumenté + requêtes préparées
+# ----------------------------
+RULING_SELECT = "key, title, content, tags, archetype, format"
+
+# Requêtes du chemin chaud, préparées une fois par connexion (init du pool).
+HOT_STATEMENTS: Dict[str, str] = {
+    "ruling_by_key": f"SELECT {RULING_SELECT} FROM rulings WHERE key = $1;",
+    "rulings_by_keys": f"SELECT {RULING_SELECT} FROM rulings WHERE key = ANY($1::text[]);",
+    "stats_flush": """INSERT INTO stats(key, count)
+                      SELECT * FROM unnest($1::text[], $2::bigint[])
+                      ON CONFLICT (key) DO UPDATE SET count = stats.count + EXCLUDED.count;""",
+    "stats_top": "SELECT key, count FROM stats ORDER BY count DESC LIMIT $1;",
+    "stats_by_keys": "SELECT key, count FROM stats WHERE key = ANY($1::text[]);",
+    "suggestion_insert": """INSERT INTO suggestions(author_id, author_name, key, title, content, tags, archetype, format,
+                                                    status, similar_to, similarity)
+                            VALUES($1,$2,$3,$4,$5,$6,$7,$8,'pending',$9,$10)
+                            RETURNING id;""",
+    "usage_flush": """INSERT INTO usage_hourly(kind, bucket, key, count)
+                      SELECT k, to_timestamp(b), key, c FROM unnest($1::text[], $2::bigint[], $3::text[], $4::bigint[]) AS u(k, b, key, c)
+                      ON CONFLICT (kind, bucket, key) DO UPDATE SET count = usage_hourly.count + EXCLUDED.count;""",
+    # une heure donnée est soit dans usage_hourly, soit (agrégée) dans usage_daily: pas de double compte
+    "usage_top": """SELECT key, SUM(count)::bigint AS count FROM (
+                        SELECT key, count FROM usage_hourly WHERE kind = $1 AND bucket >= to_timestamp($2) AND bucket < to_timestamp($3)
+                        UNION ALL
+                        SELECT key, count FROM usage_daily
+                        WHERE kind = $1 AND day >= (to_timestamp($2) AT TIME ZONE 'UTC')::date
+                          AND day < (to_timestamp($3) AT TIME ZONE 'UTC')::date
+                    ) u
+                    GROUP BY key
+                    ORDER BY count DESC, key
+                    LIMIT $4;""",
+}
+
+# Le schéma doit exister avant de préparer quoi que ce soit (voir startup()).
+schema_ready = False
+
+class RulingsConnection(asyncpg.Connection):
+    """Connexion du pool avec ses requêtes chaudes préparées (`hot`)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hot: Dict[str, Any] = {}
+
+async def init_connection(con: RulingsConnection):
+    if schema_ready:
+        for name, sql in HOT_STATEMENTS.items():
+            con.hot[name] = await con.prepare(sql)
+
+class DbMetrics:
+    def __init__(self):
+        self.acquire = LatencyHistogram()
+        self.queries: Dict[str, LatencyHistogram] = {}
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquire_timeouts = 0
+
+    def query(self, name: str, seconds: float):
+        hist = self.queries.get(name)
+        if hist is None:
+            hist = self.queries[name] = LatencyHistogram()
+        hist.observe(seconds)
+
+    def saturation(self) -> Dict[str, int]:
+        if pool is None:
+            return {}
+        size, idle = pool.get_size(), pool.get_idle_size()
+        return {
+            "size": size, "idle": idle, "busy": size - idle, "max": pool.get_max_size(),
+            "waiting": self.waiting, "max_waiting": self.max_waiting,
+        }
+
+db_metrics = DbMetrics()
+
+@asynccontextmanager
+async def db_acquire():
+    """pool.acquire() avec mesure du temps d'attente et du nombre de tâches en attente."""
+    db_metrics.waiting += 1
+    db_metrics.max_waiting = max(db_metrics.max_waiting, db_metrics.waiting)
+    t0 = time.perf_counter()
+    try:
+        con = await pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        db_metrics.acquire_timeouts += 1
+        raise
+    finally:
+        db_metrics.waiting -= 1
+    db_metrics.acquire.observe(time.perf_counter() - t0)
+    try:
+        yield con
+    finally:
+        await pool.release(con)
+
+async def hot(con: asyncpg.Connection, name: str, method: str, *args):
+    """Exécute une requête de HOT_STATEMENTS (préparée si possible) et mesure sa latence."""
+    stmt = getattr(con, "hot", {}).get(name)
+    t0 = time.perf_counter()
+    try:
+        if stmt is not None:
+            return await getattr(stmt, method)(*args)
+        return await getattr(con, method)(HOT_STATEMENTS[name], *args)
+    finally:
+        db_metrics.query(name, time.perf_counter() - t0)
+
+async def create_db_pool() -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+        connection_class=RulingsConnection,
+        init=init_connection,
+    )
 
 # ----------------------------
 # DB : init + seed
+# Migrations versionnées: chaque version ne s'applique qu'une fois (table schema_migrations).
+# Pour faire évoluer le schéma, ajouter une entrée à la fin, ne jamais modifier une entrée existante.
 # ----------------------------
-async def db_init():
-    async with pool.acquire() as con:
-        await con.execute("""
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "tables de base", [
+        """
         CREATE TABLE IF NOT EXISTS rulings (
             key TEXT PRIMARY KEY,
             title TEXT NOT NULL,
@@ -164,14 +990,14 @@ async def db_init():
             archetype TEXT,
             format TEXT
         );
-        """)
-        await con.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS stats (
             key TEXT PRIMARY KEY,
             count BIGINT NOT NULL DEFAULT 0
         );
-        """)
-        await con.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS suggestions (
             id BIGSERIAL PRIMARY KEY,
             created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
@@ -185,44 +1011,252 @@ async def db_init():
             format TEXT,
             status TEXT NOT NULL DEFAULT 'pending'
         );
-        """)
+        """,
+    ]),
+    # Tags normalisés: tableau dérivé de la colonne texte (calculé aussi pour les lignes existantes)
+    (2, "tag_list + index de filtres", [
+        r"""
+        ALTER TABLE rulings ADD COLUMN IF NOT EXISTS tag_list TEXT[]
+            GENERATED ALWAYS AS (
+                array_remove(string_to_array(lower(regexp_replace(btrim(coalesce(tags, '')), '\s*,\s*', ',', 'g')), ','), '')
+            ) STORED;
+        """,
+        "CREATE INDEX IF NOT EXISTS rulings_tag_list_idx ON rulings USING GIN (tag_list);",
+        "CREATE INDEX IF NOT EXISTS rulings_archetype_idx ON rulings (archetype);",
+        "CREATE INDEX IF NOT EXISTS rulings_format_idx ON rulings (format);",
+    ]),
+    # Recherche plein texte: contenu en français, noms de cartes en anglais (config simple)
+    (3, "recherche plein texte", [
+        """
+        ALTER TABLE rulings ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(key, '') || ' ' || coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('french', coalesce(content, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(content, '')), 'C')
+            ) STORED;
+        """,
+        "CREATE INDEX IF NOT EXISTS rulings_search_tsv_idx ON rulings USING GIN (search_tsv);",
+    ]),
+    # Change feed: chaque écriture sur rulings émet un NOTIFY (key + numéro de séquence)
+    (4, "change feed rulings", [
+        "CREATE SEQUENCE IF NOT EXISTS rulings_change_seq;",
+        """
+        CREATE OR REPLACE FUNCTION rulings_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('rulings_changed', json_build_object(
+                'op', TG_OP,
+                'key', CASE WHEN TG_OP = 'DELETE' THEN OLD.key ELSE NEW.key END,
+                'old_key', CASE WHEN TG_OP = 'UPDATE' AND OLD.key <> NEW.key THEN OLD.key END,
+                'seq', nextval('rulings_change_seq')
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS rulings_notify_trg ON rulings;",
+        """
+        CREATE TRIGGER rulings_notify_trg
+            AFTER INSERT OR UPDATE OR DELETE ON rulings
+            FOR EACH ROW EXECUTE FUNCTION rulings_notify();
+        """,
+    ]),
+    (5, "bot_meta (hash de l'arbre de commandes)", [
+        """
+        CREATE TABLE IF NOT EXISTS bot_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """,
+    ]),
+    # File de modération: status 'pending' / 'approved' / 'rejected', parcourue par id
+    (6, "modération des suggestions", [
+        "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS moderated_by TEXT;",
+        "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS moderated_at TIMESTAMPTZ;",
+        "CREATE INDEX IF NOT EXISTS suggestions_status_id_idx ON suggestions (status, id);",
+    ]),
+    # Doublons: soumissions identiques regroupées (duplicates), proches signalées (similar_to)
+    (7, "doublons de suggestions", [
+        "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS duplicates INT NOT NULL DEFAULT 0;",
+        "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS similar_to TEXT;",
+        "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS similarity REAL;",
+    ]),
+    # Analytics: hits / misses agrégés par heure, puis par jour au-delà de la rétention horaire
+    (8, "analytics horaires", [
+        """
+        CREATE TABLE IF NOT EXISTS usage_hourly (
+            kind TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            key TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, bucket, key)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            kind TEXT NOT NULL,
+            day DATE NOT NULL,
+            key TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, day, key)
+        );
+        """,
+    ]),
+    # Le change feed ne détecte plus les trous par numéro de séquence: NOTIFY sans 'seq'
+    (9, "change feed sans séquence", [
+        """
+        CREATE OR REPLACE FUNCTION rulings_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('rulings_changed', json_build_object(
+                'op', TG_OP,
+                'key', CASE WHEN TG_OP = 'DELETE' THEN OLD.key ELSE NEW.key END,
+                'old_key', CASE WHEN TG_OP = 'UPDATE' AND OLD.key <> NEW.key THEN OLD.key END
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP SEQUENCE IF EXISTS rulings_change_seq;",
+    ]),
+]
+
+# Plusieurs workers démarrent en même temps: les migrations sont sérialisées par un verrou consultatif.
+SCHEMA_LOCK_ID = 7315001
 
+async def db_applied_migrations(con: asyncpg.Connection) -> Set[int]:
+    if not await con.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL;"):
+        return set()
+    return {r["version"] for r in await con.fetch("SELECT version FROM schema_migrations;")}
+
+async def db_init():
+    """Applique les migrations manquantes. Au démarrage courant: une seule requête, aucun DDL."""
+    latest = MIGRATIONS[-1][0]
+    async with db_acquire() as con:
+        if latest in await db_applied_migrations(con):
+            return
+        await con.execute("SELECT pg_advisory_lock($1);", SCHEMA_LOCK_ID)
+        try:
+            await con.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """)
+            applied = await db_applied_migrations(con)
+            for version, name, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                t0 = time.perf_counter()
+                async with con.transaction():
+                    for sql in statements:
+                        await con.execute(sql)
+                    await con.execute(
+                        "INSERT INTO schema_migrations(version, name) VALUES($1, $2);", version, name
+                    )
+                print(f"🧱 Migration {version} ({name}) appliquée en {(time.perf_counter() - t0) * 1000:.0f} ms")
+        finally:
+            await con.execute("SELECT pg_advisory_unlock($1);", SCHEMA_LOCK_ID)
+
+RULING_COLUMNS = ["key", "title", "content", "tags", "archetype", "format"]
+
+def ruling_record(r: Dict[str, Any]) -> Tuple[str, str, str, str, Optional[str], str]:
+    """Dict seed/import -> tuple dans l'ordre de RULING_COLUMNS."""
+    return (
+        norm_key(r["key"]),
+        r["title"],
+        r["content"],
+        tags_to_str(r.get("tags", [])),
+        r.get("archetype"),
+        r.get("format", "general"),
+    )
+
+async def db_bulk_upsert_rulings(con: asyncpg.Connection, records: List[Tuple], update: bool = False) -> int:
+    """
+    Charge `records` en une transaction: COPY dans une table temporaire, puis
+    fusion dans rulings avec ON CONFLICT (DO NOTHING, ou DO UPDATE si `update`).
+    Retourne le nombre de lignes écrites dans rulings.
+    """
+    on_conflict = """DO UPDATE
+                 SET title=EXCLUDED.title, content=EXCLUDED.content, tags=EXCLUDED.tags,
+                     archetype=EXCLUDED.archetype, format=EXCLUDED.format""" if update else "DO NOTHING"
+    async with con.transaction():
+        await con.execute("""
+        CREATE TEMP TABLE rulings_stage (
+            key TEXT,
+            title TEXT,
+            content TEXT,
+            tags TEXT,
+            archetype TEXT,
+            format TEXT
+        ) ON COMMIT DROP;
+        """)
+        await con.copy_records_to_table("rulings_stage", records=records, columns=RULING_COLUMNS)
+        # DISTINCT ON: une même key ne peut être fusionnée deux fois dans un seul INSERT
+        status = await con.execute(f"""
+            INSERT INTO rulings(key, title, content, tags, archetype, format)
+            SELECT DISTINCT ON (key) key, title, content, tags, archetype, format
+            FROM rulings_stage
+            ORDER BY key
+            ON CONFLICT (key) {on_conflict};""")
+    return int(status.split()[-1])
+
+@perf.timed()
 async def db_seed_if_empty():
-    async with pool.acquire() as con:
-        n = await con.fetchval("SELECT COUNT(*) FROM rulings;")
-        if n and n > 0:
+    async with db_acquire() as con:
+        if await con.fetchval("SELECT EXISTS (SELECT 1 FROM rulings);"):
             return
-        # Insert seed
-        for r in SEED_100:
-            await con.execute(
-                """INSERT INTO rulings(key, title, content, tags, archetype, format)
-                   VALUES($1,$2,$3,$4,$5,$6)
-                   ON CONFLICT (key) DO NOTHING;""",
-                norm_key(r["key"]),
-                r["title"],
-                r["content"],
-                tags_to_str(r.get("tags", [])),
-                r.get("archetype"),
-                r.get("format", "general"),
-            )
+        t0 = time.perf_counter()
+        # seed construit seulement ici, quand la table est vraiment vide
+        records = [ruling_record(r) for r in expand_seed_to_100()]
+        inserted = await db_bulk_upsert_rulings(con, records)
+    elapsed = time.perf_counter() - t0
+    print(f"🌱 Seed: {inserted} insérés, {len(records) - inserted} ignorés ({elapsed * 1000:.0f} ms)")
 
 # ----------------------------
 # Recherche DB
 # ----------------------------
+@perf.timed()
 async def db_find_ruling(query: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
     """
     Retourne (best, others, suggestions_keys).
     best: meilleur résultat
     others: autres résultats proches (max 5)
-    suggestions: difflib sur keys existantes (max 5)
+    suggestions: keys proches au sens difflib (max 5)
     """
     q = norm_key(query)
     if not q:
         return None, [], []
 
-    async with pool.acquire() as con:
+    cache_key = ("find", q)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    result = await db_find_ruling_uncached(q)
+    best, others, suggestions = result
+    result_cache.put(cache_key, result, ([best] if best else []) + others, suggestions)
+    return result
+
+@perf.timed()
+async def db_find_ruling_uncached(q: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    if ruling_index.ready:
+        # exact d'abord, puis key/title/tags/archetype
+        ordered: List[Dict[str, Any]] = []
+        exact = ruling_index.get(q)
+        if exact:
+            ordered.append(exact)
+        with perf.stage("index.match"):
+            ordered += [ruling_index.get(k) for k in ruling_index.match(q, 20) if k != q]
+        with perf.stage("index.suggest"):
+            suggestions = ruling_index.suggest(q)
+        if not ordered:
+            return None, [], suggestions
+        return ordered[0], ordered[1:6], suggestions
+
+    async with db_acquire() as con:
         # exact
-        exact = await con.fetchrow("SELECT * FROM rulings WHERE key = $1;", q)
+        exact = await hot(con, "ruling_by_key", "fetchrow", q)
 
         # partial / title / tag / archetype
         like = f"%{q}%"
@@ -230,7 +1264,7 @@ async def db_find_ruling(query: str) -> Tuple[Optional[Dict[str, Any]], List[Dic
             """SELECT * FROM rulings
                WHERE key ILIKE $1
                   OR title ILIKE $1
-                  OR tags ILIKE $1
+                  OR tag_list @> ARRAY[$2]
                   OR archetype ILIKE $2
                LIMIT 20;""",
             like,
@@ -249,9 +1283,11 @@ async def db_find_ruling(query: str) -> Tuple[Optional[Dict[str, Any]], List[Dic
                 seen.add(r["key"])
 
         # Suggestions (keys)
-        keys = await con.fetch("SELECT key FROM rulings LIMIT 5000;")
-        key_list = [k["key"] for k in keys]
-        suggestions = difflib.get_close_matches(q, key_list, n=5, cutoff=0.55)
+        with perf.stage("sql.suggest_keys"):
+            keys = await con.fetch("SELECT key FROM rulings LIMIT 5000;")
+        with perf.stage("difflib"):
+            key_list = [k["key"] for k in keys]
+            suggestions = difflib.get_close_matches(q, key_list, n=5, cutoff=SUGGEST_CUTOFF)
 
         if not ordered:
             return None, [], suggestions
@@ -259,71 +1295,1222 @@ async def db_find_ruling(query: str) -> Tuple[Optional[Dict[str, Any]], List[Dic
         best = ordered[0]
         others = ordered[1:6]
 
-        def rec_to_dict(rec: asyncpg.Record) -> Dict[str, Any]:
-            return {
-                "key": rec["key"],
-                "title": rec["title"],
-                "content": rec["content"],
-                "tags": str_to_tags(rec["tags"]),
-                "archetype": rec["archetype"],
-                "format": rec["format"]
-            }
-
         best_d = rec_to_dict(best)
         others_d = [rec_to_dict(o) for o in others]
         return best_d, others_d, suggestions
 
-async def db_search_rulings(query: str, limit: int = 10) -> Tuple[List[Dict[str, Any]], List[str]]:
+@perf.timed()
+async def db_search_rulings(
+    query: str,
+    limit: int = 10,
+    tag: Optional[str] = None,
+    archetype: Optional[str] = None,
+    format: Optional[str] = None,
+    mode: str = "keyword",
+    after: Optional[Any] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    mode "keyword": key/titre/tags/archetype (index mémoire), suggestions difflib.
+    mode "fulltext": recherche plein texte Postgres sur tout le contenu, triée par pertinence.
+    `after` = curseur de la dernière ligne de la page précédente (keyset, pas d'OFFSET):
+    la key en mode keyword, (rank, key) en mode fulltext.
+    """
     q = norm_key(query)
-    if not q:
+    tag = norm_key(tag or "") or None
+    archetype = norm_key(archetype or "") or None
+    format = norm_key(format or "") or None
+    if not (q or tag or archetype or format):
         return [], []
 
-    async with pool.acquire() as con:
-        like = f"%{q}%"
+    cache_key = ("search", q, limit, tag, archetype, format, mode, after)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if mode == "fulltext":
+        result = await db_fulltext_rulings(query, limit, after, tag, archetype, format), []
+    else:
+        result = await db_search_rulings_uncached(q, limit, tag, archetype, format, after)
+    result_cache.put(cache_key, result, *result)
+    return result
+
+@perf.timed()
+async def db_search_rulings_uncached(
+    q: str,
+    limit: int,
+    tag: Optional[str],
+    archetype: Optional[str],
+    format: Optional[str],
+    after: Optional[str]
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    if ruling_index.ready:
+        keys = ruling_index.search(q, limit, tag, archetype, format, after)
+        out = [ruling_index.get(k) for k in keys]
+        # les suggestions ne s'affichent qu'en première page
+        suggestions = ruling_index.suggest(q) if q and after is None else []
+        return out, suggestions
+
+    async with db_acquire() as con:
         rows = await con.fetch(
             """SELECT * FROM rulings
-               WHERE key ILIKE $1
-                  OR title ILIKE $1
-                  OR tags ILIKE $1
-                  OR archetype ILIKE $2
+               WHERE ($1 = '' OR key ILIKE $2 OR title ILIKE $2 OR tag_list @> ARRAY[$1] OR archetype ILIKE $1)
+                 AND ($4::text IS NULL OR tag_list @> ARRAY[$4::text])
+                 AND ($5::text IS NULL OR archetype = $5)
+                 AND ($6::text IS NULL OR format = $6)
+                 AND ($7::text IS NULL OR key > $7)
                ORDER BY key ASC
                LIMIT $3;""",
-            like,
             q,
-            limit
+            f"%{q}%",
+            limit,
+            tag,
+            archetype,
+            format,
+            after
+        )
+        suggestions = []
+        if q and after is None:
+            with perf.stage("sql.suggest_keys"):
+                keys = await con.fetch("SELECT key FROM rulings LIMIT 5000;")
+            with perf.stage("difflib"):
+                key_list = [k["key"] for k in keys]
+                suggestions = difflib.get_close_matches(q, key_list, n=5, cutoff=SUGGEST_CUTOFF)
+
+    return [rec_to_dict(r) for r in rows], suggestions
+
+# Plafond de rulings classés par ts_rank pour une requête plein texte (le tri par rang relit chaque tsvector)
+FULLTEXT_MAX_CANDIDATES = int(os.getenv("FULLTEXT_MAX_CANDIDATES", "1000"))
+
+@perf.timed()
+async def db_fulltext_rulings(
+    query: str,
+    limit: int = 10,
+    after: Optional[Tuple[float, str]] = None,
+    tag: Optional[str] = None,
+    archetype: Optional[str] = None,
+    format: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Recherche plein texte (GIN sur search_tsv), triée par ts_rank.
+    Les mots de la question sont combinés en OU pour qu'une question en langage naturel
+    remonte les rulings qui en contiennent le plus. La config `simple` ne filtre pas les
+    mots vides (le, de, que...): elle n'ajoute que les mots que `french` garde mais
+    transforme (noms de cartes en anglais), sinon presque toute la table correspondrait.
+    Au plus FULLTEXT_MAX_CANDIDATES correspondances (ordre des keys) sont ensuite classées.
+    Chaque résultat porte un extrait `snippet` et son `rank` (curseur de page: (rank, key)).
+    """
+    q = query.strip()
+    if not q:
+        return []
+    after_rank, after_key = after if after else (None, None)
+    async with db_acquire() as con:
+        rows = await con.fetch(
+            """WITH words AS (
+                   SELECT w.lexeme, to_tsvector('french', w.lexeme) AS fr
+                   FROM unnest(to_tsvector('simple', $1)) w
+               ),
+               q AS (
+                   SELECT replace(plainto_tsquery('french', $1)::text, '&', '|')::tsquery
+                       || replace(plainto_tsquery('simple', coalesce((
+                              SELECT string_agg(lexeme, ' ') FROM words
+                              WHERE fr <> ''::tsvector AND fr <> to_tsvector('simple', lexeme)
+                          ), ''))::text, '&', '|')::tsquery AS query
+               ),
+               candidates AS (
+                   SELECT r.*
+                   FROM rulings r, q
+                   WHERE r.search_tsv @@ q.query
+                     AND ($5::text IS NULL OR r.tag_list @> ARRAY[$5::text])
+                     AND ($6::text IS NULL OR r.archetype = $6)
+                     AND ($7::text IS NULL OR r.format = $7)
+                   ORDER BY r.key
+                   LIMIT $8
+               ),
+               hits AS (
+                   SELECT c.*, ts_rank(c.search_tsv, q.query) AS rank
+                   FROM candidates c, q
+               )
+               SELECT h.*,
+                      ts_headline('french', h.content, q.query, 'StartSel=**, StopSel=**, MaxWords=20, MinWords=8') AS snippet
+               FROM hits h, q
+               WHERE $3::real IS NULL OR h.rank < $3::real OR (h.rank = $3::real AND h.key > $4)
+               ORDER BY h.rank DESC, h.key ASC
+               LIMIT $2;""",
+            q,
+            limit,
+            after_rank,
+            after_key,
+            norm_key(tag or "") or None,
+            norm_key(archetype or "") or None,
+            norm_key(format or "") or None,
+            FULLTEXT_MAX_CANDIDATES
         )
-        keys = await con.fetch("SELECT key FROM rulings LIMIT 5000;")
-        key_list = [k["key"] for k in keys]
-        suggestions = difflib.get_close_matches(q, key_list, n=5, cutoff=0.55)
-
     out = []
     for r in rows:
-        out.append({
-            "key": r["key"],
-            "title": r["title"],
-            "content": r["content"],
-            "tags": str_to_tags(r["tags"]),
-            "archetype": r["archetype"],
-            "format": r["format"]
-        })
-    return out, suggestions
+        d = rec_to_dict(r)
+        d["snippet"] = r["snippet"]
+        d["rank"] = r["rank"]
+        out.append(d)
+    return out
+
+@perf.timed()
+async def db_load_index():
+    async with db_acquire() as con:
+        rows = await con.fetch(f"SELECT {RULING_SELECT} FROM rulings;")
+    await ruling_index.rebuild(rows)
+    # rechargement complet (startup ou resync du change feed): des changements ont pu être manqués
+    result_cache.clear()
+    embed_cache.reload()
+    suggestion_dedup.mark_all_rulings()
+
+def apply_ruling_change(key: str, row: Optional[Any], invalidate: bool = True):
+    """Applique à l'état mémoire la nouvelle version de `key` (None = supprimée)."""
+    old = ruling_index.get(key)
+    if row is not None:
+        ruling_index.upsert(row)
+    else:
+        ruling_index.remove(key)
+    if invalidate:
+        new = ruling_index.get(key)
+        result_cache.invalidate_ruling(key, [r for r in (old, new) if r], added=old is None and new is not None)
+    embed_cache.refresh(key)
+    suggestion_dedup.mark_ruling(key)
+
+def apply_ruling_changes(changes: Dict[str, Optional[Any]]):
+    """Comme apply_ruling_change() pour plusieurs keys; un gros lot vide le cache de résultats d'un coup."""
+    bulk = len(changes) > RESULT_CACHE_BULK_INVALIDATE
+    if bulk:
+        result_cache.invalidations += len(result_cache.data)
+        result_cache.clear()
+    for key, row in changes.items():
+        apply_ruling_change(key, row, invalidate=not bulk)
+
+@perf.timed()
+async def rulings_changed(con: asyncpg.Connection, key: str):
+    """À appeler après toute écriture sur rulings: resynchronise l'état mémoire pour `key`."""
+    row = await hot(con, "ruling_by_key", "fetchrow", key)
+    apply_ruling_change(key, row)
+
+BULK_MODERATION_MAX = int(os.getenv("BULK_MODERATION_MAX", "500"))
+
+@perf.timed()
+async def db_moderate_suggestions(
+    ids: List[int], approve: bool, moderator: str
+) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """
+    Approuve ou rejette `ids` en une seule transaction. Retourne (issues, keys) par ID, issue =
+    "approved" / "rejected", "superseded" (même key qu'une suggestion plus récente du lot,
+    c'est elle qui est copiée), "already:<status>" (déjà traitée) ou "missing".
+    Les rulings écrits sont répercutés dans l'index mémoire après le commit.
+    """
+    status = "approved" if approve else "rejected"
+    outcomes: Dict[int, str] = {}
+    kept: Dict[str, int] = {}  # key -> id de la suggestion retenue
+    async with db_acquire() as con:
+        async with con.transaction():
+            rows = await con.fetch(
+                "SELECT id, key, status FROM suggestions WHERE id = ANY($1::bigint[]) ORDER BY id FOR UPDATE;",
+                ids
+            )
+            pending = [r for r in rows if r["status"] == "pending"]
+            pending_ids = [r["id"] for r in pending]
+            if pending_ids and approve:
+                await con.execute(
+                    """INSERT INTO rulings(key, title, content, tags, archetype, format)
+                       SELECT DISTINCT ON (key) key, title, content, tags, archetype, format
+                       FROM suggestions
+                       WHERE id = ANY($1::bigint[])
+                       ORDER BY key, id DESC
+                       ON CONFLICT (key) DO UPDATE
+                         SET title=EXCLUDED.title, content=EXCLUDED.content, tags=EXCLUDED.tags,
+                             archetype=EXCLUDED.archetype, format=EXCLUDED.format;""",
+                    pending_ids
+                )
+                for r in pending:
+                    kept[r["key"]] = max(kept.get(r["key"], 0), r["id"])
+            if pending_ids:
+                await con.execute(
+                    """UPDATE suggestions SET status=$2, moderated_by=$3, moderated_at=NOW()
+                       WHERE id = ANY($1::bigint[]);""",
+                    pending_ids, status, moderator
+                )
+
+        suggestion_dedup.discard_suggestions(r["id"] for r in pending)
+        if kept:
+            changed = await hot(con, "rulings_by_keys", "fetch", list(kept))
+            found = {r["key"]: r for r in changed}
+            apply_ruling_changes({k: found.get(k) for k in kept})
 
-async def db_inc_stat(key: str):
-    k = norm_key(key)
-    async with pool.acquire() as con:
-        await con.execute(
-            """INSERT INTO stats(key, count) VALUES($1, 1)
-               ON CONFLICT (key) DO UPDATE SET count = stats.count + 1;""",
-            k
+    for r in rows:
+        if r["status"] != "pending":
+            outcomes[r["id"]] = f"already:{r['status']}"
+        elif approve and kept[r["key"]] != r["id"]:
+            outcomes[r["id"]] = "superseded"
+        else:
+            outcomes[r["id"]] = status
+    for i in ids:
+        outcomes.setdefault(i, "missing")
+    return outcomes, {r["id"]: r["key"] for r in rows}
+
+@perf.timed()
+async def db_pending_suggestions(limit: int, before_id: Optional[int] = None) -> List[asyncpg.Record]:
+    """Suggestions en attente, plus récentes d'abord, strictement avant `before_id` (curseur)."""
+    async with db_acquire() as con:
+        return await con.fetch(
+            """SELECT id, key, title, author_name, created_at, duplicates, similar_to, similarity FROM suggestions
+               WHERE status='pending' AND ($2::bigint IS NULL OR id < $2)
+               ORDER BY id DESC
+               LIMIT $1;""",
+            limit,
+            before_id
         )
 
+# ----------------------------
+# Change feed (LISTEN/NOTIFY entre instances)
+# ----------------------------
+CHANGEFEED_ENABLED = os.getenv("CHANGEFEED", "1") == "1"
+CHANGEFEED_DEBOUNCE = float(os.getenv("CHANGEFEED_DEBOUNCE", "0.1"))
+CHANGEFEED_HEARTBEAT = float(os.getenv("CHANGEFEED_HEARTBEAT", "30"))
+
+class ChangeFeed:
+    """
+    Connexion asyncpg dédiée qui écoute `rulings_changed` et applique les
+    changements (y compris ceux des autres instances) à l'état mémoire.
+    - les keys notifiées sont regroupées (CHANGEFEED_DEBOUNCE) puis relues en une requête
+    - reconnexion automatique; après une coupure, resynchronisation complète
+    - heartbeat: simple requête sur la connexion LISTEN, pour détecter une connexion
+      morte (les notifications ne se perdent pas tant que la session est vivante).
+      Pas de détection de trou par séquence: nextval() n'est pas transactionnel,
+      une écriture annulée l'avance aussi (séquence supprimée par la migration 9).
+    """
+
+    def __init__(self):
+        self.con: Optional[asyncpg.Connection] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flush_task: Optional[asyncio.Task] = None
+        self.pending: Set[str] = set()
+        self.resyncs = 0
+        self.applied = 0
+
+    def on_notify(self, con, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        self.pending.add(data["key"])
+        if data.get("old_key"):
+            self.pending.add(data["old_key"])
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """
+        Consommateur unique: boucle tant qu'il reste des keys en attente, y compris celles
+        notifiées pendant la relecture (on_notify ne relance pas de tâche tant que celle-ci tourne).
+        """
+        delay = CHANGEFEED_DEBOUNCE
+        while self.pending:
+            await asyncio.sleep(delay)
+            keys, self.pending = list(self.pending), set()
+            try:
+                async with db_acquire() as con:
+                    rows = await hot(con, "rulings_by_keys", "fetch", keys)
+            except Exception as e:
+                print("⚠️ Change feed apply error:", e)
+                self.pending.update(keys)
+                delay = min(max(delay * 2, 1.0), 30.0)
+                continue
+            found = {r["key"]: r for r in rows}
+            apply_ruling_changes({k: found.get(k) for k in keys})
+            self.applied += len(keys)
+            delay = CHANGEFEED_DEBOUNCE
+
+    async def connect(self):
+        self.con = await asyncpg.connect(DATABASE_URL)
+        await self.con.add_listener("rulings_changed", self.on_notify)
+
+    async def resync(self, reason: str):
+        print(f"🔄 Change feed: resynchronisation complète ({reason})")
+        self.resyncs += 1
+        self.pending.clear()
+        await db_load_index()
+
+    async def heartbeat(self):
+        # une erreur ou un timeout ferme la connexion: run() reconnecte puis resynchronise
+        await self.con.fetchval("SELECT 1;", timeout=CHANGEFEED_HEARTBEAT)
+
+    async def run(self):
+        delay = 1.0
+        while True:
+            try:
+                if self.con is None or self.con.is_closed():
+                    await self.connect()
+                    await self.resync("reconnexion")
+                    delay = 1.0
+                await asyncio.sleep(CHANGEFEED_HEARTBEAT)
+                await self.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("⚠️ Change feed error:", e)
+                await self.close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    async def start(self):
+        """Connexion + LISTEN avant le chargement initial de l'index (aucun changement perdu entre les deux)."""
+        await self.connect()
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.con is not None:
+            try:
+                await self.con.close()
+            except Exception:
+                pass
+            self.con = None
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.close()
+
+changefeed = ChangeFeed()
+
+# ----------------------------
+# Doublons de suggestions (MinHash + LSH)
+# ----------------------------
+DEDUP_ENABLED = os.getenv("DEDUP", "1") == "1"
+DEDUP_SHINGLE = 5
+DEDUP_BANDS = 8
+DEDUP_ROWS = 4
+# même key et contenu quasi identique: la soumission est regroupée avec l'existante
+DEDUP_COLLAPSE = float(os.getenv("DEDUP_COLLAPSE", "0.9"))
+# au-delà: la suggestion est enregistrée mais signalée (similar_to) pour la revue
+DEDUP_FLAG = float(os.getenv("DEDUP_FLAG", "0.6"))
+DEDUP_CHUNK = 50
+
+_minhash_rng = random.Random(7315)
+MINHASH_A = [_minhash_rng.randrange(1, 1 << 32) | 1 for _ in range(DEDUP_BANDS * DEDUP_ROWS)]
+MINHASH_B = [_minhash_rng.randrange(0, 1 << 32) for _ in range(DEDUP_BANDS * DEDUP_ROWS)]
+
+def shingles(text: str) -> List[int]:
+    """Hash (crc32) des 5-grammes de caractères du texte normalisé (casse, ponctuation, espaces)."""
+    t = " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+    n = DEDUP_SHINGLE
+    return list({zlib.crc32(t[i:i + n].encode()) for i in range(max(1, len(t) - n + 1))})
+
+def minhash(title: str, content: str) -> array:
+    """Signature MinHash (32 permutations a*x+b mod 2^32) de titre + contenu."""
+    hs = shingles(f"{title} {content}")
+    return array("I", (min([(a * h + b) & 0xFFFFFFFF for h in hs]) for a, b in zip(MINHASH_A, MINHASH_B)))
+
+def minhash_similarity(a: array, b: array) -> float:
+    """Estimation de la similarité de Jaccard: part des permutations en accord."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+class SuggestionDedup:
+    """
+    Signatures MinHash des rulings et des suggestions en attente, rangées en bandes
+    LSH (8 x 4): une nouvelle suggestion n'est comparée qu'aux entrées qui partagent
+    au moins une bande, plus celles de même key. Entrées: ("r", key) / ("s", id).
+    Les rulings modifiés sont (re)signés en tâche de fond par paquets (mark_ruling).
+    """
+
+    def __init__(self):
+        self.sigs: Dict[Tuple[str, Any], array] = {}
+        self.buckets: Dict[int, Set[Tuple[str, Any]]] = {}
+        self.pending_keys: Dict[str, Set[int]] = {}
+        self.suggestion_keys: Dict[int, str] = {}
+        self.dirty: Set[str] = set()
+        self.wake = asyncio.Event()
+        # levé à la fin du chargement initial; avant, /ruling_suggest n'essaie pas de dédoublonner
+        self.loaded = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.collapsed = 0
+        self.flagged = 0
+
+    def bands(self, sig: array) -> List[int]:
+        return [hash((i, sig[i * DEDUP_ROWS:(i + 1) * DEDUP_ROWS].tobytes())) for i in range(DEDUP_BANDS)]
+
+    def add(self, ref: Tuple[str, Any], sig: array):
+        self.remove(ref)
+        self.sigs[ref] = sig
+        for b in self.bands(sig):
+            posting_add(self.buckets, b, ref)
+
+    def remove(self, ref: Tuple[str, Any]):
+        sig = self.sigs.pop(ref, None)
+        if sig is not None:
+            for b in self.bands(sig):
+                posting_discard(self.buckets, b, ref)
+
+    def add_suggestion(self, sid: int, key: str, sig: array):
+        self.add(("s", sid), sig)
+        self.suggestion_keys[sid] = key
+        self.pending_keys.setdefault(key, set()).add(sid)
+
+    def discard_suggestions(self, ids: Iterable[int]):
+        for sid in ids:
+            self.remove(("s", sid))
+            key = self.suggestion_keys.pop(sid, None)
+            if key is not None:
+                posting_discard(self.pending_keys, key, sid)
+
+    def mark_ruling(self, key: str):
+        if DEDUP_ENABLED:
+            self.dirty.add(key)
+            self.wake.set()
+
+    def mark_all_rulings(self):
+        """Resigne tous les rulings (et oublie ceux qui n'existent plus)."""
+        if DEDUP_ENABLED:
+            self.dirty.update(ruling_index.rulings)
+            self.dirty.update(ref[1] for ref in self.sigs if ref[0] == "r")
+            self.wake.set()
+
+    def sign_ruling(self, key: str):
+        r = ruling_index.get(key)
+        if r is None:
+            self.remove(("r", key))
+        else:
+            self.add(("r", key), minhash(r["title"], r["content"]))
+
+    def best_match(self, key: str, sig: array) -> Optional[Tuple[Tuple[str, Any], float, bool]]:
+        """(ref, similarité, même key) du plus proche candidat LSH ou de même key, sinon None."""
+        candidates: Set[Tuple[str, Any]] = set()
+        for b in self.bands(sig):
+            candidates |= self.buckets.get(b, set())
+        candidates |= {("s", sid) for sid in self.pending_keys.get(key, ())}
+        if ruling_index.get(key) is not None:
+            if key in self.dirty or ("r", key) not in self.sigs:
+                self.dirty.discard(key)
+                self.sign_ruling(key)
+            candidates.add(("r", key))
+        best = None
+        for ref in candidates:
+            other = self.sigs.get(ref)
+            if other is None:
+                continue
+            same_key = (ref[1] if ref[0] == "r" else self.suggestion_keys.get(ref[1])) == key
+            sim = minhash_similarity(sig, other)
+            if best is None or (same_key, sim) > (best[2], best[1]):
+                best = (ref, sim, same_key)
+        return best
+
+    async def catch_up(self):
+        """
+        Recale les suggestions en attente sur la base (autres workers): relit les ids
+        'pending' (index (status, id)), oublie celles modérées ailleurs et signe celles
+        qui manquent, y compris celles commitées dans le désordre des ids.
+        """
+        known = set(self.suggestion_keys)
+        async with db_acquire() as con:
+            ids = {r["id"] for r in await con.fetch("SELECT id FROM suggestions WHERE status='pending';")}
+            missing = sorted(ids - known)
+            rows = await con.fetch(
+                "SELECT id, key, title, content FROM suggestions WHERE id = ANY($1::bigint[]) AND status='pending' ORDER BY id;",
+                missing
+            ) if missing else []
+        # seules les entrées connues avant la lecture: celles ajoutées entre-temps sont plus récentes qu'elle
+        self.discard_suggestions(known - ids)
+        for i, r in enumerate(rows, 1):
+            self.add_suggestion(r["id"], r["key"], minhash(r["title"] or "", r["content"] or ""))
+            if i % DEDUP_CHUNK == 0:
+                await asyncio.sleep(0)
+
+    async def load(self):
+        t0 = time.perf_counter()
+        async with db_acquire() as con:
+            rows = await con.fetch("SELECT id, key, title, content FROM suggestions WHERE status='pending' ORDER BY id;")
+        for i, r in enumerate(rows, 1):
+            self.add_suggestion(r["id"], r["key"], minhash(r["title"] or "", r["content"] or ""))
+            if i % DEDUP_CHUNK == 0:
+                await asyncio.sleep(0)
+        self.loaded.set()
+        self.mark_all_rulings()
+        await self.refresh()
+        print(f"✅ Doublons: {len(rows)} suggestions + {len(ruling_index)} rulings signés "
+              f"({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+    async def refresh(self):
+        """Signe les rulings modifiés, par paquets pour ne pas bloquer la boucle."""
+        while self.dirty:
+            for _ in range(min(DEDUP_CHUNK, len(self.dirty))):
+                self.sign_ruling(self.dirty.pop())
+            await asyncio.sleep(0)
+
+    async def run(self):
+        await self.load()
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            await self.refresh()
+
+    def start(self):
+        if DEDUP_ENABLED and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+suggestion_dedup = SuggestionDedup()
+
+def dedup_ref_label(ref: Tuple[str, Any]) -> str:
+    return f"ruling {ref[1]}" if ref[0] == "r" else f"suggestion {ref[1]}"
+
+# ----------------------------
+# Import (JSON / JSON Lines, en streaming)
+# ----------------------------
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_DIR = os.path.abspath(os.getenv("IMPORT_DIR", "data"))
+IMPORT_CHUNK_SIZE = 1 << 16
+
+def iter_json_array(f) -> Iterable[Any]:
+    """
+    Itère les éléments d'un tableau JSON sans charger tout le fichier.
+    Une erreur de décodage loin de la fin du tampon est une vraie erreur de syntaxe
+    (pas un élément coupé par la lecture): on lève tout de suite, sans lire la suite.
+    Un élément qui se termine en fin de tampon peut être coupé (nombre): on lit la suite avant de le rendre.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    offset = 0  # caractères déjà consommés avant buf
+    expect = "["  # "[", puis "first" (élément ou "]"), "value" (après ",") ou "sep" ("," ou "]")
+    eof = False
+    while True:
+        i = 0
+        while i < len(buf) and buf[i].isspace():
+            i += 1
+        if i < len(buf):
+            if expect == "[":
+                if buf[i] != "[":
+                    raise ValueError("Un tableau JSON était attendu")
+                expect = "first"
+                buf = buf[i + 1:]
+                offset += i + 1
+                continue
+            if expect == "sep" or (expect == "first" and buf[i] == "]"):
+                if buf[i] == "]":
+                    return
+                if buf[i] != ",":
+                    raise ValueError(f"JSON invalide au caractère {offset + i}: ',' ou ']' attendu")
+                expect = "value"
+                buf = buf[i + 1:]
+                offset += i + 1
+                continue
+            try:
+                obj, end = decoder.raw_decode(buf, i)
+            except json.JSONDecodeError as e:
+                # un élément tronqué échoue au bout du tampon (ou sur une chaîne non
+                # fermée, ou un échappement \uXXXX coupé dans les derniers caractères)
+                truncated = e.msg.startswith("Unterminated string") or e.pos >= len(buf) - 6
+                if eof or not truncated:
+                    raise ValueError(f"JSON invalide au caractère {offset + e.pos}: {e.msg}")
+            else:
+                # un nombre coupé en fin de tampon se décode aussi ("12", "1.5" de "1.5e3"):
+                # on ne rend l'élément que s'il est suivi d'un séparateur ou loin de la fin
+                follow = buf[end:end + 3]
+                if eof or len(follow) == 3 or (follow and (follow[0] in ",]" or follow[0].isspace())):
+                    yield obj
+                    expect = "sep"
+                    buf = buf[end:]
+                    offset += end
+                    continue
+        if eof:
+            raise ValueError("Fichier JSON tronqué")
+        chunk = f.read(IMPORT_CHUNK_SIZE)
+        eof = not chunk
+        buf = buf[i:] + chunk
+        offset += i
+
+def iter_json_lines(f) -> Iterable[Any]:
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Ligne {n}: JSON invalide ({e.msg})")
+
+def iter_ruling_file(path: str) -> Iterable[Any]:
+    """JSON (tableau) ou JSON Lines, détecté d'après le premier caractère."""
+    with open(path, encoding="utf-8") as f:
+        head = ""
+        while True:
+            c = f.read(1)
+            if not c or not c.isspace():
+                head = c
+                break
+        f.seek(0)
+        if head == "[":
+            yield from iter_json_array(f)
+        else:
+            yield from iter_json_lines(f)
+
+def import_record(obj: Any) -> Tuple[str, str, str, str, Optional[str], str]:
+    """Valide et normalise une entrée importée (ValueError si invalide)."""
+    if not isinstance(obj, dict):
+        raise ValueError("entrée non-objet")
+    for field in ("key", "title", "content"):
+        if not isinstance(obj.get(field), str) or not obj[field].strip():
+            raise ValueError(f"champ `{field}` manquant")
+    for field in ("archetype", "format"):
+        if obj.get(field) is not None and not isinstance(obj[field], str):
+            raise ValueError(f"champ `{field}` invalide (texte attendu)")
+    tags = obj.get("tags") or []
+    if isinstance(tags, str):
+        tags = str_to_tags(tags)
+    elif not isinstance(tags, list) or not all(isinstance(t, (str, int, float)) for t in tags):
+        raise ValueError("champ `tags` invalide (liste ou texte séparé par des virgules attendu)")
+    return ruling_record({
+        "key": obj["key"],
+        "title": obj["title"].strip(),
+        "content": obj["content"].strip(),
+        "tags": [str(t) for t in tags],
+        "archetype": (obj.get("archetype") or "").strip().lower() or None,
+        "format": (obj.get("format") or "general").strip().lower(),
+    })
+
+async def import_batch(con: asyncpg.Connection, batch: Dict[str, Tuple], dry_run: bool, report: Dict[str, Any]):
+    rows = await con.fetch(
+        "SELECT key, title, content, tags, archetype, format FROM rulings WHERE key = ANY($1::text[]);",
+        list(batch)
+    )
+    # /ruling_add stocke les tags tels que saisis: on les normalise comme ruling_record()
+    # pour ne pas compter comme "changed" une ligne qui ne diffère que par la casse/l'ordre
+    existing = {
+        r["key"]: (r["key"], r["title"], r["content"], tags_to_str(str_to_tags(r["tags"])), r["archetype"], r["format"])
+        for r in rows
+    }
+    to_write = []
+    for key, rec in batch.items():
+        old = existing.get(key)
+        if old is None:
+            report["new"] += 1
+            if len(report["new_keys"]) < 10:
+                report["new_keys"].append(key)
+        elif old != rec:
+            report["changed"] += 1
+            if len(report["changed_keys"]) < 10:
+                report["changed_keys"].append(key)
+        else:
+            report["unchanged"] += 1
+            continue
+        to_write.append(rec)
+    if dry_run or not to_write:
+        return
+    await db_bulk_upsert_rulings(con, to_write, update=True)
+    apply_ruling_changes({rec[0]: dict(zip(RULING_COLUMNS, rec)) for rec in to_write})
+
+@perf.timed()
+async def import_rulings(path: str, dry_run: bool = False, batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Importe un fichier JSON/JSONL par lots de `batch_size` (upsert).
+    En dry_run rien n'est écrit: seul le diff (new/changed/unchanged) est calculé.
+    """
+    report: Dict[str, Any] = {
+        "new": 0, "changed": 0, "unchanged": 0, "invalid": 0,
+        "new_keys": [], "changed_keys": [], "errors": [],
+    }
+    t0 = time.perf_counter()
+    batch: Dict[str, Tuple] = {}
+    async with db_acquire() as con:
+        for n, obj in enumerate(iter_ruling_file(path), 1):
+            try:
+                rec = import_record(obj)
+            except ValueError as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < 10:
+                    report["errors"].append(f"#{n}: {e}")
+                continue
+            batch[rec[0]] = rec  # doublon dans le lot: la dernière version gagne
+            if len(batch) >= batch_size:
+                await import_batch(con, batch, dry_run, report)
+                batch = {}
+        if batch:
+            await import_batch(con, batch, dry_run, report)
+    report["elapsed"] = time.perf_counter() - t0
+    return report
+
+def format_import_report(report: Dict[str, Any], dry_run: bool) -> str:
+    lines = [
+        f"{'Dry-run' if dry_run else 'Import'}: "
+        f"{report['new']} nouveaux, {report['changed']} modifiés, "
+        f"{report['unchanged']} inchangés, {report['invalid']} invalides "
+        f"({report['elapsed']:.1f} s)"
+    ]
+    if report["new_keys"]:
+        lines.append("Nouveaux: " + ", ".join(f"`{k}`" for k in report["new_keys"]))
+    if report["changed_keys"]:
+        lines.append("Modifiés: " + ", ".join(f"`{k}`" for k in report["changed_keys"]))
+    if report["errors"]:
+        lines.append("Erreurs: " + "; ".join(report["errors"]))
+    return "\n".join(lines)
+
+# ----------------------------
+# Stats : compteur en écriture différée
+# ----------------------------
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "10"))
+
+class StatsBuffer:
+    """
+    Agrège les incréments par key en mémoire et les écrit toutes les
+    STATS_FLUSH_INTERVAL secondes en un seul upsert multi-lignes.
+    Les deltas pas encore écrits restent visibles via deltas().
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pending: Dict[str, int] = {}
+        self.inflight: Dict[str, int] = {}
+        # compteurs connus (base au démarrage + incréments), pour classer l'autocomplete
+        self.known: Dict[str, int] = {}
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def inc(self, key: str, n: int = 1):
+        self.pending[key] = self.pending.get(key, 0) + n
+        self.known[key] = self.known.get(key, 0) + n
+
+    async def load_known(self):
+        async with db_acquire() as con:
+            rows = await con.fetch("SELECT key, count FROM stats;")
+        known = {r["key"]: int(r["count"]) for r in rows}
+        for k, c in self.deltas().items():
+            known[k] = known.get(k, 0) + c
+        self.known = known
+
+    def deltas(self) -> Dict[str, int]:
+        out = dict(self.inflight)
+        for k, c in self.pending.items():
+            out[k] = out.get(k, 0) + c
+        return out
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            self.inflight, self.pending = self.pending, {}
+            try:
+                async with db_acquire() as con:
+                    await hot(con, "stats_flush", "fetch", list(self.inflight.keys()), list(self.inflight.values()))
+            except Exception:
+                # on remet les deltas en attente pour le prochain flush
+                for k, c in self.inflight.items():
+                    self.pending[k] = self.pending.get(k, 0) + c
+                raise
+            finally:
+                self.inflight = {}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print("⚠️ Stats flush error:", e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+stats_buffer = StatsBuffer(STATS_FLUSH_INTERVAL)
+
+@perf.timed()
+async def db_inc_stat(key: str):
+    stats_buffer.inc(norm_key(key))
+
+@perf.timed()
 async def db_top_stats(limit: int = 10) -> List[Tuple[str, int]]:
-    async with pool.acquire() as con:
-        rows = await con.fetch(
-            "SELECT key, count FROM stats ORDER BY count DESC LIMIT $1;",
-            limit
+    deltas = stats_buffer.deltas()
+    async with db_acquire() as con:
+        rows = await hot(con, "stats_top", "fetch", limit)
+        counts = {r["key"]: int(r["count"]) for r in rows}
+        if deltas:
+            # compteurs en base des keys qui ont des deltas non écrits
+            rows = await hot(con, "stats_by_keys", "fetch", list(deltas))
+            counts.update({r["key"]: int(r["count"]) for r in rows})
+    for k, c in deltas.items():
+        counts[k] = counts.get(k, 0) + c
+    return sorted(counts.items(), key=lambda kc: (-kc[1], kc[0]))[:limit]
+
+# ----------------------------
+# Analytics (hits / misses par heure)
+# ----------------------------
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "30"))
+ANALYTICS_ROLLUP_INTERVAL = float(os.getenv("ANALYTICS_ROLLUP_INTERVAL", "3600"))
+# au-delà, les heures sont agrégées par jour (UTC); au-delà de la rétention journalière, supprimées
+ANALYTICS_HOURLY_RETENTION = float(os.getenv("ANALYTICS_HOURLY_RETENTION_HOURS", "192"))
+ANALYTICS_DAILY_RETENTION = float(os.getenv("ANALYTICS_DAILY_RETENTION_DAYS", "180"))
+ANALYTICS_LOCK_ID = 7315002
+ANALYTICS_KEY_MAX = 100
+
+def hour_bucket(t: float) -> int:
+    return int(t) // 3600 * 3600
+
+class UsageBuffer:
+    """
+    Comme StatsBuffer, mais par (type, heure, key): "hit" = key de ruling servie,
+    "miss" = requête normalisée sans résultat. Un upsert multi-lignes par flush;
+    la tâche de fond agrège aussi les vieilles heures en jours (rollup).
+    """
+
+    def __init__(self, interval: float, rollup_interval: float):
+        self.interval = interval
+        self.rollup_interval = rollup_interval
+        self.pending: Dict[Tuple[str, int, str], int] = {}
+        self.inflight: Dict[Tuple[str, int, str], int] = {}
+        self.last_rollup = 0.0
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def inc(self, kind: str, key: str, n: int = 1):
+        k = (kind, hour_bucket(time.time()), key[:ANALYTICS_KEY_MAX])
+        self.pending[k] = self.pending.get(k, 0) + n
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            self.inflight, self.pending = self.pending, {}
+            kinds, buckets, keys = zip(*self.inflight)
+            try:
+                async with db_acquire() as con:
+                    await hot(con, "usage_flush", "fetch", list(kinds), list(buckets), list(keys),
+                              list(self.inflight.values()))
+            except Exception:
+                for k, c in self.inflight.items():
+                    self.pending[k] = self.pending.get(k, 0) + c
+                raise
+            finally:
+                self.inflight = {}
+
+    async def rollup(self) -> Tuple[int, int]:
+        """Heures > rétention -> usage_daily; jours > rétention supprimés. Un seul worker à la fois."""
+        now = time.time()
+        cutoff = int(now - ANALYTICS_HOURLY_RETENTION * 3600) // 86400 * 86400
+        expire = int(now - ANALYTICS_DAILY_RETENTION * 86400) // 86400 * 86400
+        async with db_acquire() as con:
+            async with con.transaction():
+                if not await con.fetchval("SELECT pg_try_advisory_xact_lock($1);", ANALYTICS_LOCK_ID):
+                    return 0, 0
+                moved = await con.fetchval(
+                    """WITH moved AS (
+                           DELETE FROM usage_hourly WHERE bucket < to_timestamp($1)
+                           RETURNING kind, bucket, key, count
+                       ), rolled AS (
+                           INSERT INTO usage_daily(kind, day, key, count)
+                           SELECT kind, (bucket AT TIME ZONE 'UTC')::date, key, SUM(count)
+                           FROM moved
+                           GROUP BY 1, 2, 3
+                           ON CONFLICT (kind, day, key) DO UPDATE SET count = usage_daily.count + EXCLUDED.count
+                       )
+                       SELECT COUNT(*) FROM moved;""",
+                    cutoff
+                )
+                res = await con.execute(
+                    "DELETE FROM usage_daily WHERE day < (to_timestamp($1) AT TIME ZONE 'UTC')::date;", expire
+                )
+        return moved, int(res.split()[-1])
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self.last_rollup >= self.rollup_interval:
+                    self.last_rollup = time.monotonic()
+                    moved, expired = await self.rollup()
+                    if moved or expired:
+                        print(f"📦 Analytics: {moved} lignes horaires agrégées, {expired} jours expirés")
+            except Exception as e:
+                print("⚠️ Analytics flush error:", e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+usage_buffer = UsageBuffer(ANALYTICS_FLUSH_INTERVAL, ANALYTICS_ROLLUP_INTERVAL)
+
+@perf.timed()
+async def db_record_usage(kind: str, key: str):
+    usage_buffer.inc(kind, norm_key(key))
+
+@perf.timed()
+async def db_top_usage(
+    kind: str, hours: float, limit: int = 10
+) -> List[Tuple[str, int, int]]:
+    """
+    Top `limit` keys de la fenêtre [maintenant - hours, maintenant] avec, pour chacune,
+    le compte de la fenêtre précédente de même durée: [(key, count, previous)].
+    Au-delà de la rétention horaire la fenêtre est arrondie au jour (UTC).
+    """
+    now = time.time()
+    start, prev_start = hour_bucket(now - hours * 3600), hour_bucket(now - 2 * hours * 3600)
+    end = hour_bucket(now) + 3600
+    # requête rare: on écrit d'abord les compteurs en attente plutôt que de les fusionner
+    await usage_buffer.flush()
+    async with db_acquire() as con:
+        rows = await hot(con, "usage_top", "fetch", kind, start, end, limit)
+        top = [(r["key"], int(r["count"])) for r in rows]
+        prev_rows = await con.fetch(
+            """SELECT key, SUM(count)::bigint AS count FROM (
+                   SELECT key, count FROM usage_hourly
+                   WHERE kind = $1 AND bucket >= to_timestamp($2) AND bucket < to_timestamp($3) AND key = ANY($4::text[])
+                   UNION ALL
+                   SELECT key, count FROM usage_daily
+                   WHERE kind = $1 AND day >= (to_timestamp($2) AT TIME ZONE 'UTC')::date
+                     AND day < (to_timestamp($3) AT TIME ZONE 'UTC')::date AND key = ANY($4::text[])
+               ) u
+               GROUP BY key;""",
+            kind, prev_start, start, [k for k, _ in top]
         )
-    return [(r["key"], int(r["count"])) for r in rows]
+    previous = {r["key"]: int(r["count"]) for r in prev_rows}
+    return [(k, c, previous.get(k, 0)) for k, c in top]
+
+# ----------------------------
+# Tâches de fond (effets secondaires non critiques)
+# ----------------------------
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000"))
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+# Backpressure: temps max d'attente d'une place libre avant d'abandonner la tâche.
+BACKGROUND_PUT_TIMEOUT = float(os.getenv("BACKGROUND_PUT_TIMEOUT", "0.05"))
+LOOKUP_LOG = os.getenv("LOOKUP_LOG", "0") == "1"
+
+class BackgroundQueue:
+    """
+    File bornée + workers pour les effets secondaires (stats, logs) lancés
+    après avoir répondu à l'interaction. Une tâche qui échoue est loggée et
+    comptée, elle ne remonte jamais jusqu'à la commande.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.workers = workers
+        self.tasks: List[asyncio.Task] = []
+        self.dropped = 0
+        self.failed = 0
+
+    async def submit(self, name: str, fn, *args) -> bool:
+        try:
+            await asyncio.wait_for(self.queue.put((name, fn, args)), BACKGROUND_PUT_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            print(f"⚠️ Background queue pleine, tâche abandonnée: {name}")
+            return False
+
+    async def worker(self):
+        while True:
+            name, fn, args = await self.queue.get()
+            try:
+                await fn(*args)
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Background task error ({name}):", repr(e))
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Background queue: {self.queue.qsize()} tâche(s) non traitée(s) à l'arrêt")
+        for t in self.tasks:
+            t.cancel()
+        self.tasks = []
+
+background = BackgroundQueue(BACKGROUND_QUEUE_SIZE, BACKGROUND_WORKERS)
+
+async def log_lookup(command: str, query: str, result: Optional[str]):
+    if LOOKUP_LOG:
+        print(f"🔎 /{command} {query!r} -> {result or '∅'}")
+
+async def defer(interaction: discord.Interaction, ephemeral: bool = False):
+    """Acquitte l'interaction ("réfléchit...") si ce n'est pas déjà fait."""
+    if not interaction.response.is_done():
+        await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        # porté par l'interaction elle-même (voir reply()): rien à nettoyer si la commande plante
+        interaction.extras["public_defer"] = not ephemeral
+
+def needs_db(ephemeral: bool = True):
+    """
+    Fait patienter la commande derrière db_ready (au lieu de planter sur pool=None).
+    L'interaction est acquittée avant l'attente pour tenir le délai de 3 s de Discord.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+            if not db_ready.is_set():
+                await defer(interaction, ephemeral=ephemeral)
+                try:
+                    await asyncio.wait_for(db_ready.wait(), DB_READY_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await reply(interaction, "⏳ La base démarre encore, réessaie dans un instant.", ephemeral=True)
+                    return
+            return await fn(interaction, *args, **kwargs)
+        return wrapper
+    return decorator
+
+@perf.timed("discord.reply")
+async def reply(interaction: discord.Interaction, *args, **kwargs):
+    """
+    send_message, ou followup si l'interaction a déjà été acquittée (defer).
+    Après un defer public, le premier followup remplace le message "réfléchit..." et
+    ignore ephemeral: on supprime alors ce message avant d'envoyer la réponse privée.
+    """
+    if interaction.extras.pop("public_defer", False):
+        if kwargs.get("ephemeral"):
+            try:
+                await interaction.delete_original_response()
+            except discord.HTTPException:
+                pass
+    if interaction.response.is_done():
+        await interaction.followup.send(*args, **kwargs)
+    else:
+        await interaction.response.send_message(*args, **kwargs)
+
+# ----------------------------
+# Limitation de débit (token buckets par utilisateur et par serveur)
+# ----------------------------
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT", "1") == "1"
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "60"))
+# "<user|guild>.<commande ou *>=<rafale>/<secondes>", séparés par des virgules;
+# RATE_LIMITS complète / remplace ces valeurs par défaut.
+DEFAULT_RATE_LIMITS = (
+    "user.*=10/10,guild.*=120/10,"
+    "user.ruling_search=6/10,user.page=20/10,"
+    "user.ruling_suggest=3/300,guild.ruling_suggest=30/300"
+)
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """"user.ruling=5/10" -> {"user.ruling": (5.0, 10.0)} (capacité, période en secondes)"""
+    out: Dict[str, Tuple[float, float]] = {}
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        name, value = part.split("=", 1)
+        burst, period = value.split("/", 1)
+        out[name.lower()] = (float(burst), float(period))
+    return out
+
+class RateLimiter:
+    """
+    Token bucket par (portée, commande, id): `rafale` appels d'un coup, puis un
+    jeton regagné toutes les période/rafale secondes. Une commande sans limite
+    dédiée partage le bucket "*" de sa portée. Un bucket redevenu plein est
+    équivalent à un bucket absent: le balayage périodique le supprime.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], sweep_interval: float):
+        self.limits = limits
+        self.sweep_interval = sweep_interval
+        self.buckets: Dict[Tuple[str, str, int], List[float]] = {}  # -> [jetons, dernière mise à jour]
+        self.allowed: Dict[str, int] = {}
+        self.rejected: Dict[Tuple[str, str], int] = {}  # (portée, commande) -> refus
+        self.evicted = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def limit_name(self, scope: str, command: str) -> Optional[str]:
+        for name in (f"{scope}.{command}", f"{scope}.*"):
+            if name in self.limits:
+                return name
+        return None
+
+    def refill(self, name: str, bucket: List[float], now: float) -> float:
+        burst, period = self.limits[name]
+        return min(burst, bucket[0] + (now - bucket[1]) * burst / period)
+
+    def acquire(self, command: str, user_id: int, guild_id: Optional[int]) -> float:
+        """Consomme un jeton dans chaque bucket concerné; 0 si accepté, sinon secondes avant réessai."""
+        now = time.monotonic()
+        targets = []
+        for scope, ident in (("user", user_id), ("guild", guild_id)):
+            name = self.limit_name(scope, command) if ident is not None else None
+            if name is None:
+                continue
+            bkey = (scope, name.split(".", 1)[1], ident)
+            bucket = self.buckets.get(bkey)
+            if bucket is None:
+                bucket = [self.limits[name][0], now]
+            tokens = self.refill(name, bucket, now)
+            if tokens < 1:
+                burst, period = self.limits[name]
+                self.rejected[(scope, command)] = self.rejected.get((scope, command), 0) + 1
+                return (1 - tokens) * period / burst
+            targets.append((bkey, tokens))
+        # aucun jeton n'est pris si l'un des buckets refuse
+        for bkey, tokens in targets:
+            self.buckets[bkey] = [tokens - 1, now]
+        self.allowed[command] = self.allowed.get(command, 0) + 1
+        return 0.0
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        full = []
+        for (scope, command, ident), bucket in self.buckets.items():
+            name = f"{scope}.{command}"
+            if name not in self.limits or self.refill(name, bucket, now) >= self.limits[name][0]:
+                full.append((scope, command, ident))
+        for bkey in full:
+            del self.buckets[bkey]
+        self.evicted += len(full)
+        return len(full)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def start(self):
+        if self.sweep_interval > 0 and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+rate_limiter = RateLimiter(
+    {**parse_rate_limits(DEFAULT_RATE_LIMITS), **parse_rate_limits(os.getenv("RATE_LIMITS", ""))},
+    RATE_LIMIT_SWEEP_INTERVAL
+)
+
+def rate_limit_wait(interaction: discord.Interaction, command: str) -> float:
+    """0 si l'appel passe (admins exemptés), sinon secondes avant réessai."""
+    if not RATE_LIMIT_ENABLED or is_admin(interaction):
+        return 0.0
+    return rate_limiter.acquire(command, interaction.user.id, interaction.guild_id)
+
+def rate_limited(fn):
+    """Refuse la commande (réponse éphémère, sans requête) quand un bucket de l'utilisateur ou du serveur est vide."""
+    @functools.wraps(fn)
+    async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+        wait = rate_limit_wait(interaction, fn.__name__)
+        if wait:
+            await reply(interaction, f"⏳ Doucement! Réessaie dans {max(1, round(wait))} s.", ephemeral=True)
+            return
+        return await fn(interaction, *args, **kwargs)
+    return wrapper
 
 # ----------------------------
 # Embeds
@@ -344,85 +2531,617 @@ def embed_ruling(r: Dict[str, Any]) -> discord.Embed:
     e.set_footer(text=f"Key: {r['key']}")
     return e
 
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "256"))
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(1 << 20)))
+
+class PayloadEmbed(discord.Embed):
+    """Embed déjà sérialisé: discord.py envoie tel quel le dict renvoyé par to_dict()."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        super().__init__()
+        self.payload = payload
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.payload
+
+class EmbedCache:
+    """
+    Payloads d'embed_ruling() (dicts prêts à envoyer) des rulings les plus demandés, en LRU.
+    Préchauffé au startup depuis db_top_stats(), reconstruit par apply_ruling_change().
+    Plafonné en nombre d'entrées et en octets (taille du JSON).
+    Les payloads sont partagés: ne jamais les modifier, en dériver une copie (with_fields).
+    """
+
+    def __init__(self, maxsize: int, max_bytes: int):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.data: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rebuilds = 0
+
+    def put(self, key: str, payload: Dict[str, Any]):
+        self.drop(key)
+        size = len(json.dumps(payload, ensure_ascii=False).encode())
+        if self.maxsize <= 0 or size > self.max_bytes:
+            return
+        self.data[key] = (payload, size)
+        self.bytes += size
+        while len(self.data) > self.maxsize or self.bytes > self.max_bytes:
+            _, (_, old_size) = self.data.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+
+    def drop(self, key: str):
+        item = self.data.pop(key, None)
+        if item is not None:
+            self.bytes -= item[1]
+
+    def payload(self, r: Dict[str, Any]) -> Dict[str, Any]:
+        item = self.data.get(r["key"])
+        if item is not None:
+            self.data.move_to_end(r["key"])
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+        payload = embed_ruling(r).to_dict()
+        self.put(r["key"], payload)
+        return payload
+
+    def refresh(self, key: str):
+        """Le ruling `key` a changé: reconstruit son payload s'il était en cache."""
+        if key not in self.data:
+            return
+        r = ruling_index.get(key)
+        if r is None:
+            self.drop(key)
+            return
+        self.put(key, embed_ruling(r).to_dict())
+        self.rebuilds += 1
+
+    def reload(self):
+        """Reconstruit tous les payloads depuis l'index (après un rechargement complet)."""
+        for key in list(self.data):
+            r = ruling_index.get(key)
+            if r is None:
+                self.drop(key)
+            else:
+                self.put(key, embed_ruling(r).to_dict())
+                self.rebuilds += 1
+
+    async def warm(self):
+        """Préchauffe avec les keys les plus consultées (du moins au plus populaire: LRU)."""
+        top = await db_top_stats(limit=self.maxsize)
+        for key, _ in reversed(top):
+            r = ruling_index.get(key)
+            if r is not None:
+                self.put(key, embed_ruling(r).to_dict())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.data), "maxsize": self.maxsize, "bytes": self.bytes, "max_bytes": self.max_bytes,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "rebuilds": self.rebuilds,
+        }
+
+embed_cache = EmbedCache(EMBED_CACHE_SIZE, EMBED_CACHE_MAX_BYTES)
+
+def with_fields(payload: Dict[str, Any], fields: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Copie superficielle du payload avec des champs (non inline) ajoutés à la fin."""
+    if not fields:
+        return payload
+    extra = [{"name": name, "value": value, "inline": False} for name, value in fields]
+    return {**payload, "fields": payload.get("fields", []) + extra}
+
+# ----------------------------
+# Pagination (boutons, curseur keyset)
+# ----------------------------
+SEARCH_PAGE_SIZE = 12
+REVIEW_PAGE_SIZE = 10
+PAGINATION_TIMEOUT = float(os.getenv("PAGINATION_TIMEOUT", "300"))
+PAGINATION_MAX_VIEWS = int(os.getenv("PAGINATION_MAX_VIEWS", "500"))
+
+class Paginator(discord.ui.View):
+    """
+    Boutons ◀ / ▶ sous une liste paginée par curseur: chaque page est une requête
+    de plage (`key > $last`, `id < $last`) à partir de la dernière ligne de la page
+    précédente, jamais un OFFSET. Les curseurs des pages déjà vues restent en
+    mémoire dans la vue, qui expire après PAGINATION_TIMEOUT.
+    """
+    live: "OrderedDict[int, Paginator]" = OrderedDict()
+
+    def __init__(
+        self,
+        name: str,
+        page_size: int,
+        fetch,      # async (curseur ou None, limit) -> lignes
+        cursor_of,  # ligne -> curseur de la page suivante
+        render,     # (lignes, n° de page) -> Embed
+    ):
+        super().__init__(timeout=PAGINATION_TIMEOUT)
+        self.name = name
+        self.page_size = page_size
+        self.fetch = fetch
+        self.cursor_of = cursor_of
+        self.render = render
+        self.starts: List[Any] = [None]  # curseur de début de chaque page vue
+        self.page = 0
+        self.rows: List[Any] = []
+        self.interaction: Optional[discord.Interaction] = None
+
+    async def load(self, page: int, rows: Optional[List[Any]] = None):
+        """Charge la page `page` (0 = première); `rows` permet de fournir une première page déjà lue."""
+        if rows is None:
+            with perf.stage(f"page.{self.name}"):
+                rows = await self.fetch(self.starts[page], self.page_size + 1)
+        has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        self.page = page
+        if has_next and len(self.starts) == page + 1:
+            self.starts.append(self.cursor_of(self.rows[-1]))
+        self.prev_page.disabled = page == 0
+        self.next_page.disabled = not has_next
+
+    def embed(self) -> discord.Embed:
+        return self.render(self.rows, self.page + 1)
+
+    async def send(self, interaction: discord.Interaction):
+        """Première réponse (éphémère); les boutons n'apparaissent que s'il y a une page suivante."""
+        if self.next_page.disabled:
+            await reply(interaction, embed=self.embed(), ephemeral=True)
+            return
+        self.interaction = interaction
+        Paginator.live[id(self)] = self
+        while len(Paginator.live) > PAGINATION_MAX_VIEWS:
+            _, oldest = Paginator.live.popitem(last=False)
+            oldest.stop()
+            asyncio.create_task(oldest.on_timeout())
+        await reply(interaction, embed=self.embed(), view=self, ephemeral=True)
+
+    async def turn(self, interaction: discord.Interaction, page: int):
+        wait = rate_limit_wait(interaction, "page")
+        if wait:
+            await reply(interaction, f"⏳ Doucement! Réessaie dans {max(1, round(wait))} s.", ephemeral=True)
+            return
+        await self.load(page)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, max(self.page - 1, 0))
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        Paginator.live.pop(id(self), None)
+        if self.interaction is not None:
+            try:
+                await self.interaction.edit_original_response(view=None)
+            except discord.HTTPException:
+                pass
+
+# ----------------------------
+# Shards : latence et débit d'événements
+# ----------------------------
+SHARD_REPORT_INTERVAL = float(os.getenv("SHARD_REPORT_INTERVAL", "300"))
+
+def interaction_shard(interaction: discord.Interaction) -> int:
+    if interaction.guild is not None and interaction.guild.shard_id is not None:
+        return interaction.guild.shard_id
+    if interaction.guild_id and bot.shard_count:
+        return (interaction.guild_id >> 22) % bot.shard_count
+    return bot.shard_id or 0
+
+class ShardMetrics:
+    """
+    Compte les événements gateway (process) et les interactions (par shard) sur
+    une fenêtre glissante remise à zéro à chaque rapport périodique.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.events = 0
+        self.interactions: Dict[int, int] = {}
+        self.window_start = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+    def latencies(self) -> List[Tuple[int, float]]:
+        if isinstance(bot, commands.AutoShardedBot):
+            return sorted(bot.latencies)
+        return [(bot.shard_id or 0, bot.latency)]
+
+    def report(self) -> List[str]:
+        elapsed = max(time.monotonic() - self.window_start, 1e-6)
+        guilds: Dict[int, int] = {}
+        for g in bot.guilds:
+            guilds[g.shard_id or 0] = guilds.get(g.shard_id or 0, 0) + 1
+        lines = []
+        for sid, lat in self.latencies():
+            lat_txt = f"{lat * 1000:.0f} ms" if lat == lat and lat != float("inf") else "—"
+            per_min = 60 * self.interactions.get(sid, 0) / elapsed
+            lines.append(f"Shard {sid}: {lat_txt}, {guilds.get(sid, 0)} serveurs, {per_min:.1f} interactions/min")
+        lines.append(f"Process: {self.events / elapsed:.1f} événements gateway/s sur {elapsed:.0f} s")
+        return lines
+
+    def reset(self):
+        self.events = 0
+        self.interactions = {}
+        self.window_start = time.monotonic()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if bot.is_ready():
+                print("📡 " + " | ".join(self.report()))
+            self.reset()
+
+    def start(self):
+        if self.interval > 0 and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+shard_metrics = ShardMetrics(SHARD_REPORT_INTERVAL)
+
+@bot.event
+async def on_socket_event_type(event_type: str):
+    shard_metrics.events += 1
+
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    sid = interaction_shard(interaction)
+    shard_metrics.interactions[sid] = shard_metrics.interactions.get(sid, 0) + 1
+
+# ----------------------------
+# Export Prometheus (local)
+# ----------------------------
+def prom_summary(lines: List[str], metric: str, label: str, hists: Dict[str, LatencyHistogram]):
+    lines.append(f"# TYPE {metric} summary")
+    for name, hist in sorted(hists.items()):
+        lbl = f'{label}="{name}"'
+        for q, v in zip(("0.5", "0.95", "0.99"), hist.percentiles(50, 95, 99)):
+            lines.append(f'{metric}{{{lbl},quantile="{q}"}} {v:.6f}')
+        lines.append(f"{metric}_sum{{{lbl}}} {hist.total:.6f}")
+        lines.append(f"{metric}_count{{{lbl}}} {hist.count}")
+
+def prometheus_text() -> str:
+    lines: List[str] = []
+    prom_summary(lines, "ygo_stage_seconds", "stage", perf.stages)
+    prom_summary(lines, "ygo_db_query_seconds", "query", db_metrics.queries)
+    prom_summary(lines, "ygo_db_acquire_seconds", "pool", {"main": db_metrics.acquire})
+    for name, value in db_metrics.saturation().items():
+        lines.append(f'ygo_db_pool{{state="{name}"}} {value}')
+    for name, value in result_cache.stats().items():
+        lines.append(f'ygo_result_cache{{counter="{name}"}} {value}')
+    for name, value in embed_cache.stats().items():
+        lines.append(f'ygo_embed_cache{{counter="{name}"}} {value}')
+    lines.append(f"ygo_background_queue_size {background.queue.qsize()}")
+    lines.append(f"ygo_background_dropped_total {background.dropped}")
+    lines.append(f"ygo_background_failed_total {background.failed}")
+    lines.append(f"ygo_rate_limit_buckets {len(rate_limiter.buckets)}")
+    lines.append(f"ygo_suggestions_collapsed_total {suggestion_dedup.collapsed}")
+    lines.append(f"ygo_suggestions_flagged_total {suggestion_dedup.flagged}")
+    for command, n in sorted(rate_limiter.allowed.items()):
+        lines.append(f'ygo_rate_limit_allowed_total{{command="{command}"}} {n}')
+    for (scope, command), n in sorted(rate_limiter.rejected.items()):
+        lines.append(f'ygo_rate_limit_rejected_total{{scope="{scope}",command="{command}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+async def handle_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        if request.split(b" ")[1:2] == [b"/metrics"]:
+            body, status = prometheus_text().encode(), "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+metrics_server: Optional[asyncio.AbstractServer] = None
+
 # ----------------------------
 # Discord lifecycle
 # ----------------------------
+SYNC_GUILD_ID = int(os.getenv("SYNC_GUILD_ID", "0")) or None
+FORCE_SYNC = os.getenv("FORCE_SYNC", "0") == "1"
+# posé par le superviseur: seul le worker 0 synchronise l'arbre (les commandes sont globales)
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+TREE_SYNC_LOCK_ID = 7315003
+tree_synced = False
+
+def command_tree_hash(guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """Empreinte des commandes (noms, paramètres, descriptions, choix) telle qu'envoyée à Discord."""
+    payload = sorted((c.to_dict(bot.tree) for c in bot.tree.get_commands(guild=guild)), key=lambda d: d["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+async def db_meta_get(con: asyncpg.Connection, key: str) -> Optional[str]:
+    return await con.fetchval("SELECT value FROM bot_meta WHERE key=$1;", key)
+
+async def db_meta_set(con: asyncpg.Connection, key: str, value: str):
+    await con.execute(
+        """INSERT INTO bot_meta(key, value) VALUES($1, $2)
+           ON CONFLICT (key) DO UPDATE SET value=EXCLUDED.value, updated_at=NOW();""",
+        key, value
+    )
+
+async def sync_command_tree():
+    """
+    Ne resynchronise l'arbre (appel limité par Discord) que si son empreinte a changé.
+    SYNC_GUILD_ID: sync sur un seul serveur (instantané, pour itérer); FORCE_SYNC=1 ignore l'empreinte.
+    Seul le worker 0 synchronise; le verrou consultatif couvre aussi deux déploiements
+    qui se chevauchent (lecture, sync et écriture de l'empreinte sous le même verrou).
+    """
+    if WORKER_INDEX != 0:
+        return
+    t0 = time.perf_counter()
+    guild = discord.Object(id=SYNC_GUILD_ID) if SYNC_GUILD_ID else None
+    scope = f"guild {SYNC_GUILD_ID}" if guild else "global"
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+    digest = command_tree_hash(guild)
+    meta_key = f"command_tree_hash:{SYNC_GUILD_ID or 'global'}"
+
+    await db_ready.wait()
+    async with db_acquire() as con:
+        await con.execute("SELECT pg_advisory_lock($1);", TREE_SYNC_LOCK_ID)
+        try:
+            if not FORCE_SYNC and await db_meta_get(con, meta_key) == digest:
+                print(f"✅ Slash commands sync ({scope}): inchangé, ignoré ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+                return
+            synced = await bot.tree.sync(guild=guild)
+            await db_meta_set(con, meta_key, digest)
+        finally:
+            await con.execute("SELECT pg_advisory_unlock($1);", TREE_SYNC_LOCK_ID)
+    print(f"✅ Slash commands sync ({scope}): {len(synced)} en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
 @bot.event
 async def on_ready():
+    global tree_synced
     print(f"✅ Logged in as {bot.user} (id={bot.user.id})")
+    # on_ready se redéclenche à chaque reconnexion gateway: une seule sync par process
+    if tree_synced:
+        return
+    tree_synced = True
     try:
-        synced = await bot.tree.sync()
-        print(f"✅ Slash commands sync: {len(synced)}")
+        await sync_command_tree()
     except Exception as e:
+        tree_synced = False
         print("⚠️ Sync error:", e)
 
 async def startup():
-    global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=5)
+    """
+    Initialisation DB, lancée en parallèle de la connexion Discord (voir main()).
+    db_ready est levé dès que le schéma et le seed sont prêts; le chargement de
+    l'index mémoire suit (les commandes passent par Postgres en attendant).
+    """
+    global pool, schema_ready, metrics_server
+    t0 = time.perf_counter()
+    background.start()
+    shard_metrics.start()
+    rate_limiter.start()
+    if PERF_METRICS_PORT:
+        metrics_server = await asyncio.start_server(handle_metrics, PERF_METRICS_HOST, PERF_METRICS_PORT)
+        print(f"📈 Métriques Prometheus: http://{PERF_METRICS_HOST}:{PERF_METRICS_PORT}/metrics")
+
+    pool = await create_db_pool()
     await db_init()
+    # les connexions ouvertes avant le DDL n'ont rien préparé: on les recycle
+    schema_ready = True
+    await pool.expire_connections()
     await db_seed_if_empty()
+    stats_buffer.start()
+    usage_buffer.start()
+    db_ready.set()
+    print(f"✅ Base prête en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    if CHANGEFEED_ENABLED:
+        await changefeed.start()
+    await db_load_index()
+    await stats_buffer.load_known()
+    await embed_cache.warm()
+    suggestion_dedup.start()
+    print(f"✅ Index mémoire: {len(ruling_index)} rulings ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+async def shutdown():
+    if metrics_server:
+        metrics_server.close()
+    shard_metrics.stop()
+    rate_limiter.stop()
+    suggestion_dedup.stop()
+    await changefeed.stop()
+    await background.stop()
+    try:
+        await stats_buffer.stop()
+    except Exception as e:
+        print("⚠️ Stats flush error:", e)
+    try:
+        await usage_buffer.stop()
+    except Exception as e:
+        print("⚠️ Analytics flush error:", e)
+    if pool:
+        await pool.close()
 
 # ----------------------------
 # Commands (public)
 # ----------------------------
 @bot.tree.command(name="ruling", description="Affiche le meilleur ruling (base + archetypes + tags).")
 @app_commands.describe(topic="Ex: damage step, ash blossom, branded, labrynth, etc.")
+@perf.timed("cmd.ruling")
+@rate_limited
+@needs_db(ephemeral=False)
 async def ruling(interaction: discord.Interaction, topic: str):
+    # Sans index mémoire la recherche passe par Postgres: on acquitte tout de suite
+    # pour ne pas risquer le délai de 3 s de Discord.
+    if not ruling_index.ready:
+        await defer(interaction)
+
     best, others, suggestions = await db_find_ruling(topic)
 
     if not best:
         msg = "Je n’ai rien trouvé dans la base."
         if suggestions:
             msg += "\nSuggestions: " + ", ".join(f"`{s}`" for s in suggestions)
-        await interaction.response.send_message(msg, ephemeral=True)
+        await reply(interaction, msg, ephemeral=True)
+        await background.submit("usage", db_record_usage, "miss", topic)
+        await background.submit("log", log_lookup, "ruling", topic, None)
         return
 
-    await db_inc_stat(best["key"])
-
-    e = embed_ruling(best)
-    if others:
-        lines = "\n".join(f"• `{o['key']}` — {o['title']}" for o in others[:5])
-        e.add_field(name="Autres résultats proches", value=lines[:1024], inline=False)
-    if suggestions:
-        e.add_field(name="Suggestions", value=", ".join(f"`{s}`" for s in suggestions), inline=False)
+    with perf.stage("embed_ruling"):
+        fields = []
+        if others:
+            lines = "\n".join(f"• `{o['key']}` — {o['title']}" for o in others[:5])
+            fields.append(("Autres résultats proches", lines[:1024]))
+        if suggestions:
+            fields.append(("Suggestions", ", ".join(f"`{s}`" for s in suggestions)))
+        e = PayloadEmbed(with_fields(embed_cache.payload(best), fields))
 
-    await interaction.response.send_message(embed=e)
+    await reply(interaction, embed=e)
+    await background.submit("stats", db_inc_stat, best["key"])
+    await background.submit("usage", db_record_usage, "hit", best["key"])
+    await background.submit("log", log_lookup, "ruling", topic, best["key"])
 
 @bot.tree.command(name="ruling_search", description="Liste des résultats (sans afficher tout le contenu).")
-@app_commands.describe(query="Mot-clé (key/titre/tags/archetype)")
-async def ruling_search(interaction: discord.Interaction, query: str):
-    rows, suggestions = await db_search_rulings(query, limit=12)
+@app_commands.describe(
+    query="Mot-clé (key/titre/tags/archetype), ou question en mode texte",
+    tag="Filtre: tag exact (ex: hand trap)",
+    archetype="Filtre: archetype (ex: branded)",
+    format="Filtre: general/tcg/ocg/masterduel",
+    mode="mots-clés (défaut) ou texte (cherche aussi dans le contenu des rulings)"
+)
+@app_commands.choices(mode=[
+    app_commands.Choice(name="mots-clés", value="keyword"),
+    app_commands.Choice(name="texte", value="fulltext"),
+])
+@perf.timed("cmd.ruling_search")
+@rate_limited
+@needs_db()
+async def ruling_search(
+    interaction: discord.Interaction,
+    query: Optional[str] = "",
+    tag: Optional[str] = "",
+    archetype: Optional[str] = "",
+    format: Optional[str] = "",
+    mode: Optional[app_commands.Choice[str]] = None
+):
+    query = query or ""
+    search_mode = mode.value if mode else "keyword"
+    if search_mode == "fulltext" and not query.strip():
+        await reply(interaction, "Le mode texte demande une question ou des mots-clés.", ephemeral=True)
+        return
+    if not any(norm_key(v or "") for v in (query, tag, archetype, format)):
+        await reply(interaction, "Indique un mot-clé ou au moins un filtre.", ephemeral=True)
+        return
+    if search_mode == "fulltext" or not ruling_index.ready:
+        await defer(interaction, ephemeral=True)
+
+    async def fetch(after: Optional[Any], limit: int) -> List[Dict[str, Any]]:
+        rows, _ = await db_search_rulings(
+            query, limit=limit, tag=tag, archetype=archetype, format=format, mode=search_mode, after=after
+        )
+        return rows
+
+    rows, suggestions = await db_search_rulings(
+        query, limit=SEARCH_PAGE_SIZE + 1, tag=tag, archetype=archetype, format=format, mode=search_mode
+    )
     if not rows:
         msg = "Aucun résultat."
         if suggestions:
             msg += "\nSuggestions: " + ", ".join(f"`{s}`" for s in suggestions)
-        await interaction.response.send_message(msg, ephemeral=True)
+        await reply(interaction, msg, ephemeral=True)
+        if query.strip():
+            await background.submit("usage", db_record_usage, "miss", query)
+        await background.submit("log", log_lookup, "ruling_search", query, None)
         return
 
-    lines = []
-    for r in rows:
-        extra = []
-        if r.get("archetype"):
-            extra.append(r["archetype"])
-        if r.get("format"):
-            extra.append(r["format"])
-        extra_txt = f" ({', '.join(extra)})" if extra else ""
-        lines.append(f"• `{r['key']}` — {r['title']}{extra_txt}")
-
-    e = discord.Embed(title=f"Résultats pour: {query}", description="\n".join(lines)[:4000])
-    if suggestions:
-        e.add_field(name="Suggestions", value=", ".join(f"`{s}`" for s in suggestions), inline=False)
-    await interaction.response.send_message(embed=e, ephemeral=True)
+    filters = [f"{name}={v}" for name, v in (("tag", tag), ("archetype", archetype), ("format", format)) if v]
+    label = " ".join([query] + [f"[{f}]" for f in filters]).strip()
+
+    def render(page_rows: List[Dict[str, Any]], page: int) -> discord.Embed:
+        lines = []
+        for r in page_rows:
+            extra = []
+            if r.get("archetype"):
+                extra.append(r["archetype"])
+            if r.get("format"):
+                extra.append(r["format"])
+            extra_txt = f" ({', '.join(extra)})" if extra else ""
+            lines.append(f"• `{r['key']}` — {r['title']}{extra_txt}")
+            if r.get("snippet"):
+                lines.append(f"  › {r['snippet']}")
+        e = discord.Embed(title=f"Résultats pour: {label}"[:256], description="\n".join(lines)[:4000])
+        if suggestions and page == 1:
+            e.add_field(name="Suggestions", value=", ".join(f"`{s}`" for s in suggestions), inline=False)
+        if page > 1 or len(rows) > SEARCH_PAGE_SIZE:
+            e.set_footer(text=f"Page {page}")
+        return e
+
+    if search_mode == "fulltext":
+        cursor_of = lambda r: (r["rank"], r["key"])
+    else:
+        cursor_of = lambda r: r["key"]
+    view = Paginator("ruling_search", SEARCH_PAGE_SIZE, fetch, cursor_of, render)
+    await view.load(0, rows)
+    await view.send(interaction)
+    await background.submit("log", log_lookup, "ruling_search", query, f"{len(view.rows)} résultat(s)")
 
 @bot.tree.command(name="ruling_stats", description="Top des rulings les plus consultés.")
+@perf.timed("cmd.ruling_stats")
+@rate_limited
+@needs_db(ephemeral=False)
 async def ruling_stats(interaction: discord.Interaction):
     top = await db_top_stats(limit=10)
     if not top:
-        await interaction.response.send_message("Aucune statistique pour l’instant.", ephemeral=True)
+        await reply(interaction, "Aucune statistique pour l’instant.", ephemeral=True)
         return
     text = "\n".join(f"{i+1}. `{k}` — **{c}**" for i, (k, c) in enumerate(top))
     e = discord.Embed(title="📊 Top Rulings", description=text)
-    await interaction.response.send_message(embed=e)
+    await reply(interaction, embed=e)
+
+USAGE_WINDOWS = [
+    app_commands.Choice(name="24 heures", value=24),
+    app_commands.Choice(name="7 jours", value=168),
+    app_commands.Choice(name="30 jours", value=720),
+]
+
+def usage_trend(count: int, previous: int) -> str:
+    if not previous:
+        return "🆕"
+    change = (count - previous) / previous
+    if abs(change) < 0.05:
+        return "="
+    return f"{'▲' if change > 0 else '▼'} {change:+.0%}"
+
+@bot.tree.command(name="ruling_trending", description="Rulings les plus consultés sur une période récente.")
+@app_commands.describe(window="Période (défaut: 7 jours)")
+@app_commands.choices(window=USAGE_WINDOWS)
+@perf.timed("cmd.ruling_trending")
+@rate_limited
+@needs_db(ephemeral=False)
+async def ruling_trending(interaction: discord.Interaction, window: Optional[app_commands.Choice[int]] = None):
+    window = window or USAGE_WINDOWS[1]
+    top = await db_top_usage("hit", window.value, limit=10)
+    if not top:
+        await reply(interaction, "Aucune consultation sur cette période.", ephemeral=True)
+        return
+    text = "\n".join(f"{i+1}. `{k}` — **{c}** {usage_trend(c, prev)}" for i, (k, c, prev) in enumerate(top))
+    e = discord.Embed(title=f"🔥 Tendances — {window.name}", description=text)
+    e.set_footer(text="Évolution par rapport à la période précédente")
+    await reply(interaction, embed=e)
 
 @bot.tree.command(name="ruling_suggest", description="Propose un ruling (envoyé en attente de validation).")
 @app_commands.describe(
@@ -433,6 +3152,9 @@ async def ruling_stats(interaction: discord.Interaction):
     archetype="Optionnel (ex: branded, tearlaments, labrynth)",
     format="general/tcg/ocg/masterduel"
 )
+@perf.timed("cmd.ruling_suggest")
+@rate_limited
+@needs_db()
 async def ruling_suggest(
     interaction: discord.Interaction,
     key: str,
@@ -442,26 +3164,69 @@ async def ruling_suggest(
     archetype: Optional[str] = "",
     format: Optional[str] = "general"
 ):
-    async with pool.acquire() as con:
-        await con.execute(
-            """INSERT INTO suggestions(author_id, author_name, key, title, content, tags, archetype, format, status)
-               VALUES($1,$2,$3,$4,$5,$6,$7,$8,'pending');""",
+    # L'INSERT est le résultat de la commande: on acquitte d'abord, on confirme ensuite.
+    await defer(interaction, ephemeral=True)
+    k = norm_key(key)
+    title, content = title.strip(), content.strip()
+    match = None
+    # pas de dédoublonnage tant que le chargement initial n'est pas fini (il signerait tout ici)
+    dedup = DEDUP_ENABLED and suggestion_dedup.loaded.is_set()
+    if dedup:
+        await suggestion_dedup.catch_up()
+        with perf.stage("dedup.match"):
+            sig = minhash(title, content)
+            match = suggestion_dedup.best_match(k, sig)
+
+    async with db_acquire() as con:
+        if match and match[2] and match[1] >= DEDUP_COLLAPSE:
+            ref = match[0]
+            if ref[0] == "r":
+                suggestion_dedup.collapsed += 1
+                await reply(interaction, f"ℹ️ Ce ruling existe déjà: `{k}`. Rien n'a été ajouté.", ephemeral=True)
+                return
+            done = await con.execute(
+                "UPDATE suggestions SET duplicates = duplicates + 1 WHERE id=$1 AND status='pending';", ref[1]
+            )
+            if done == "UPDATE 1":
+                suggestion_dedup.collapsed += 1
+                await reply(
+                    interaction,
+                    f"ℹ️ Une suggestion quasi identique est déjà en attente (ID {ref[1]}): la tienne y a été regroupée.",
+                    ephemeral=True
+                )
+                return
+            # déjà traitée par un autre worker
+            suggestion_dedup.discard_suggestions([ref[1]])
+            match = None
+
+        flag = match if match and (match[2] or match[1] >= DEDUP_FLAG) else None
+        sid = await hot(
+            con, "suggestion_insert", "fetchval",
             str(interaction.user.id),
             str(interaction.user),
-            norm_key(key),
-            title.strip(),
-            content.strip(),
+            k,
+            title,
+            content,
             (tags or "").strip(),
             (archetype or "").strip().lower() or None,
-            (format or "general").strip().lower()
+            (format or "general").strip().lower(),
+            dedup_ref_label(flag[0]) if flag else None,
+            flag[1] if flag else None
         )
+    if dedup:
+        suggestion_dedup.add_suggestion(sid, k, sig)
+    if flag:
+        suggestion_dedup.flagged += 1
 
-    await interaction.response.send_message("✅ Suggestion enregistrée. Un admin pourra la valider.", ephemeral=True)
+    await reply(interaction, "✅ Suggestion enregistrée. Un admin pourra la valider.", ephemeral=True)
+    await background.submit("log", log_lookup, "ruling_suggest", key, k)
 
 # ----------------------------
 # Commands (admin)
 # ----------------------------
 @bot.tree.command(name="ruling_add", description="(Admin) Ajoute un ruling en base.")
+@perf.timed("cmd.ruling_add")
+@needs_db()
 async def ruling_add(
     interaction: discord.Interaction,
     key: str,
@@ -472,10 +3237,10 @@ async def ruling_add(
     format: Optional[str] = "general"
 ):
     if not is_admin(interaction):
-        await interaction.response.send_message("Commande réservée aux admins.", ephemeral=True)
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
         return
 
-    async with pool.acquire() as con:
+    async with db_acquire() as con:
         await con.execute(
             """INSERT INTO rulings(key, title, content, tags, archetype, format)
                VALUES($1,$2,$3,$4,$5,$6)
@@ -489,9 +3254,12 @@ async def ruling_add(
             (archetype or "").strip().lower() or None,
             (format or "general").strip().lower(),
         )
-    await interaction.response.send_message(f"✅ Ajout/MàJ: `{norm_key(key)}`", ephemeral=True)
+        await rulings_changed(con, norm_key(key))
+    await reply(interaction, f"✅ Ajout/MàJ: `{norm_key(key)}`", ephemeral=True)
 
 @bot.tree.command(name="ruling_edit", description="(Admin) Modifie un ruling existant (par key).")
+@perf.timed("cmd.ruling_edit")
+@needs_db()
 async def ruling_edit(
     interaction: discord.Interaction,
     key: str,
@@ -502,14 +3270,14 @@ async def ruling_edit(
     format: Optional[str] = ""
 ):
     if not is_admin(interaction):
-        await interaction.response.send_message("Commande réservée aux admins.", ephemeral=True)
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
         return
 
     k = norm_key(key)
-    async with pool.acquire() as con:
-        row = await con.fetchrow("SELECT * FROM rulings WHERE key=$1;", k)
+    async with db_acquire() as con:
+        row = await hot(con, "ruling_by_key", "fetchrow", k)
         if not row:
-            await interaction.response.send_message(f"❌ Key inconnue: `{k}`", ephemeral=True)
+            await reply(interaction, f"❌ Key inconnue: `{k}`", ephemeral=True)
             return
 
         new_title = title.strip() or row["title"]
@@ -522,71 +3290,419 @@ async def ruling_edit(
             """UPDATE rulings SET title=$2, content=$3, tags=$4, archetype=$5, format=$6 WHERE key=$1;""",
             k, new_title, new_content, new_tags, new_arch, new_fmt
         )
+        await rulings_changed(con, k)
 
-    await interaction.response.send_message(f"✅ Modifié: `{k}`", ephemeral=True)
+    await reply(interaction, f"✅ Modifié: `{k}`", ephemeral=True)
 
 @bot.tree.command(name="ruling_delete", description="(Admin) Supprime un ruling.")
+@perf.timed("cmd.ruling_delete")
+@needs_db()
 async def ruling_delete(interaction: discord.Interaction, key: str):
     if not is_admin(interaction):
-        await interaction.response.send_message("Commande réservée aux admins.", ephemeral=True)
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
         return
     k = norm_key(key)
-    async with pool.acquire() as con:
+    async with db_acquire() as con:
         res = await con.execute("DELETE FROM rulings WHERE key=$1;", k)
-    await interaction.response.send_message(f"🗑️ Supprimé: `{k}`", ephemeral=True)
+        await rulings_changed(con, k)
+    await reply(interaction, f"🗑️ Supprimé: `{k}`", ephemeral=True)
+
+async def ruling_key_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Servi uniquement depuis la mémoire: aucune requête Postgres par frappe."""
+    if not ruling_index.ready:
+        return []
+    keys = ruling_index.complete(norm_key(current), stats_buffer.known)
+    out = []
+    for k in keys:
+        r = ruling_index.get(k)
+        name = k if norm_key(r["title"]) == k else f"{k} — {r['title']}"
+        out.append(app_commands.Choice(name=name[:100], value=k[:100]))
+    return out
+
+ruling.autocomplete("topic")(ruling_key_autocomplete)
+ruling_edit.autocomplete("key")(ruling_key_autocomplete)
+ruling_delete.autocomplete("key")(ruling_key_autocomplete)
 
 @bot.tree.command(name="ruling_review", description="(Admin) Voir les suggestions en attente.")
+@perf.timed("cmd.ruling_review")
+@needs_db()
 async def ruling_review(interaction: discord.Interaction):
     if not is_admin(interaction):
-        await interaction.response.send_message("Commande réservée aux admins.", ephemeral=True)
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
         return
-    async with pool.acquire() as con:
-        rows = await con.fetch(
-            "SELECT id, key, title, author_name, created_at FROM suggestions WHERE status='pending' ORDER BY id DESC LIMIT 10;"
-        )
+    rows = await db_pending_suggestions(REVIEW_PAGE_SIZE + 1)
     if not rows:
-        await interaction.response.send_message("Aucune suggestion en attente.", ephemeral=True)
+        await reply(interaction, "Aucune suggestion en attente.", ephemeral=True)
         return
 
-    lines = []
-    for r in rows:
-        lines.append(f"• ID **{r['id']}** — `{r['key']}` — {r['title']} (par {r['author_name']})")
-    e = discord.Embed(title="🧾 Suggestions (pending)", description="\n".join(lines)[:4000])
-    await interaction.response.send_message(embed=e, ephemeral=True)
+    def render(page_rows: List[asyncpg.Record], page: int) -> discord.Embed:
+        lines = []
+        for r in page_rows:
+            line = f"• ID **{r['id']}** — `{r['key']}` — {r['title']} (par {r['author_name']})"
+            if r["duplicates"]:
+                line += f" • +{r['duplicates']} doublon(s)"
+            if r["similar_to"]:
+                line += f"\n  ⚠️ proche de {r['similar_to']} ({r['similarity']:.0%})"
+            lines.append(line)
+        e = discord.Embed(title="🧾 Suggestions (pending)", description="\n".join(lines)[:4000])
+        if page > 1 or len(rows) > REVIEW_PAGE_SIZE:
+            e.set_footer(text=f"Page {page}")
+        return e
+
+    view = Paginator(
+        "ruling_review", REVIEW_PAGE_SIZE,
+        lambda before_id, limit: db_pending_suggestions(limit, before_id), lambda r: r["id"], render
+    )
+    await view.load(0, rows)
+    await view.send(interaction)
+
+MODERATION_LABELS = [
+    ("approved", "✅ Approuvées"),
+    ("superseded", "↪️ Approuvées mais remplacées (même key, la plus récente est retenue)"),
+    ("rejected", "🚫 Rejetées"),
+    ("already:approved", "⏭️ Déjà approuvées"),
+    ("already:rejected", "⏭️ Déjà rejetées"),
+    ("missing", "❌ Introuvables"),
+]
+
+def format_moderation_report(outcomes: Dict[int, str]) -> discord.Embed:
+    by_outcome: Dict[str, List[int]] = {}
+    for i, outcome in outcomes.items():
+        by_outcome.setdefault(outcome, []).append(i)
+    e = discord.Embed(title=f"🧾 Modération — {len(outcomes)} suggestion(s)")
+    labels = dict(MODERATION_LABELS)
+    order = [o for o, _ in MODERATION_LABELS] + sorted(set(by_outcome) - set(labels))
+    for outcome in order:
+        if outcome in by_outcome:
+            ids = by_outcome[outcome]
+            e.add_field(
+                name=f"{labels.get(outcome, outcome)} ({len(ids)})",
+                value=format_id_ranges(ids)[:1024],
+                inline=False
+            )
+    return e
+
+async def moderate(interaction: discord.Interaction, ids: str, approve: bool):
+    try:
+        id_list = parse_id_ranges(ids, BULK_MODERATION_MAX)
+    except ValueError as e:
+        await reply(interaction, f"❌ IDs invalides ({e}). Ex: `12, 15, 20-40`", ephemeral=True)
+        return
+    if not id_list:
+        await reply(interaction, "❌ Aucun ID. Ex: `12, 15, 20-40`", ephemeral=True)
+        return
+    await defer(interaction, ephemeral=True)
+    outcomes, _ = await db_moderate_suggestions(id_list, approve, str(interaction.user))
+    await reply(interaction, embed=format_moderation_report(outcomes), ephemeral=True)
 
 @bot.tree.command(name="ruling_approve", description="(Admin) Valider une suggestion (copie en rulings).")
+@perf.timed("cmd.ruling_approve")
+@needs_db()
 async def ruling_approve(interaction: discord.Interaction, suggestion_id: int):
     if not is_admin(interaction):
-        await interaction.response.send_message("Commande réservée aux admins.", ephemeral=True)
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
         return
 
-    async with pool.acquire() as con:
-        s = await con.fetchrow(
-            "SELECT * FROM suggestions WHERE id=$1 AND status='pending';",
-            suggestion_id
-        )
-        if not s:
-            await interaction.response.send_message("❌ Suggestion introuvable ou déjà traitée.", ephemeral=True)
-            return
+    outcomes, keys = await db_moderate_suggestions([suggestion_id], True, str(interaction.user))
+    if outcomes[suggestion_id] != "approved":
+        await reply(interaction, "❌ Suggestion introuvable ou déjà traitée.", ephemeral=True)
+        return
+    await reply(interaction, f"✅ Suggestion approuvée et ajoutée: `{keys[suggestion_id]}`", ephemeral=True)
 
-        await con.execute(
-            """INSERT INTO rulings(key, title, content, tags, archetype, format)
-               VALUES($1,$2,$3,$4,$5,$6)
-               ON CONFLICT (key) DO UPDATE
-                 SET title=EXCLUDED.title, content=EXCLUDED.content, tags=EXCLUDED.tags,
-                     archetype=EXCLUDED.archetype, format=EXCLUDED.format;""",
-            s["key"], s["title"], s["content"], s["tags"], s["archetype"], s["format"]
+@bot.tree.command(name="ruling_approve_many", description="(Admin) Valide plusieurs suggestions en une transaction.")
+@app_commands.describe(ids="IDs et plages, ex: 12, 15, 20-40")
+@perf.timed("cmd.ruling_approve_many")
+@needs_db()
+async def ruling_approve_many(interaction: discord.Interaction, ids: str):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    await moderate(interaction, ids, approve=True)
+
+@bot.tree.command(name="ruling_reject", description="(Admin) Rejette une ou plusieurs suggestions.")
+@app_commands.describe(ids="IDs et plages, ex: 12, 15, 20-40")
+@perf.timed("cmd.ruling_reject")
+@needs_db()
+async def ruling_reject(interaction: discord.Interaction, ids: str):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    await moderate(interaction, ids, approve=False)
+
+@bot.tree.command(name="ruling_misses", description="(Admin) Recherches sans résultat les plus fréquentes.")
+@app_commands.describe(window="Période (défaut: 7 jours)")
+@app_commands.choices(window=USAGE_WINDOWS)
+@perf.timed("cmd.ruling_misses")
+@needs_db()
+async def ruling_misses(interaction: discord.Interaction, window: Optional[app_commands.Choice[int]] = None):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    window = window or USAGE_WINDOWS[1]
+    top = await db_top_usage("miss", window.value, limit=20)
+    if not top:
+        await reply(interaction, "Aucune recherche infructueuse sur cette période.", ephemeral=True)
+        return
+    lines = []
+    for k, c, prev in top:
+        line = f"• `{k}` — **{c}** {usage_trend(c, prev)}"
+        if ruling_index.get(k):
+            line += " (✅ existe maintenant)"
+        lines.append(line)
+    e = discord.Embed(title=f"🕳️ Recherches sans résultat — {window.name}", description="\n".join(lines)[:4000])
+    e.set_footer(text="Candidats pour les prochains rulings (/ruling_add)")
+    await reply(interaction, embed=e, ephemeral=True)
+
+@bot.tree.command(name="ruling_cache", description="(Admin) Statistiques du cache de recherche.")
+@perf.timed("cmd.ruling_cache")
+async def ruling_cache(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    st = result_cache.stats()
+    lookups = st["hits"] + st["misses"]
+    ratio = f"{100 * st['hits'] / lookups:.1f}%" if lookups else "—"
+    e = discord.Embed(title="🗃️ Cache de recherche")
+    e.add_field(name="Taille", value=f"{st['size']} / {st['maxsize']} (TTL {RESULT_CACHE_TTL:.0f} s)", inline=False)
+    e.add_field(name="Hits / Misses", value=f"{st['hits']} / {st['misses']} ({ratio})", inline=False)
+    e.add_field(
+        name="Sorties",
+        value=f"Évictions LRU: {st['evictions']} • Expirées: {st['expired']} • Invalidations: {st['invalidations']}",
+        inline=False
+    )
+    es = embed_cache.stats()
+    lookups = es["hits"] + es["misses"]
+    ratio = f"{100 * es['hits'] / lookups:.1f}%" if lookups else "—"
+    e.add_field(
+        name="Embeds pré-rendus",
+        value=f"{es['size']} / {es['maxsize']} • {es['bytes'] / 1024:.0f} / {es['max_bytes'] / 1024:.0f} Kio • "
+              f"hits {es['hits']} / misses {es['misses']} ({ratio}) • reconstruits {es['rebuilds']} • "
+              f"évincés {es['evictions']}",
+        inline=False
+    )
+    await reply(interaction, embed=e, ephemeral=True)
+
+@bot.tree.command(name="ruling_shards", description="(Admin) Latence et débit par shard de ce process.")
+@perf.timed("cmd.ruling_shards")
+async def ruling_shards(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    e = discord.Embed(title="📡 Shards", description="\n".join(shard_metrics.report())[:4000])
+    e.set_footer(text=f"Shard courant: {interaction_shard(interaction)} • {bot.shard_count or 1} shard(s) au total")
+    await reply(interaction, embed=e, ephemeral=True)
+
+@bot.tree.command(name="ruling_ratelimit", description="(Admin) Limites de débit, refus et buckets actifs.")
+@perf.timed("cmd.ruling_ratelimit")
+async def ruling_ratelimit(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    e = discord.Embed(title="🚦 Limitation de débit" + ("" if RATE_LIMIT_ENABLED else " (désactivée)"))
+    limits = [f"`{name}`: {burst:g} / {period:g} s" for name, (burst, period) in sorted(rate_limiter.limits.items())]
+    e.add_field(name="Limites (rafale / période)", value="\n".join(limits)[:1024] or "Aucune.", inline=False)
+    lines = []
+    for command in sorted(set(rate_limiter.allowed) | {c for _, c in rate_limiter.rejected}):
+        refused = " • ".join(
+            f"{scope} {n}" for (scope, c), n in sorted(rate_limiter.rejected.items()) if c == command
         )
-        await con.execute("UPDATE suggestions SET status='approved' WHERE id=$1;", suggestion_id)
+        lines.append(f"`{command}`: {rate_limiter.allowed.get(command, 0)} acceptés, refusés: {refused or '0'}")
+    e.add_field(name="Appels", value="\n".join(lines)[:1024] or "Aucun appel.", inline=False)
+    e.set_footer(text=f"{len(rate_limiter.buckets)} buckets actifs • {rate_limiter.evicted} évincés (inactifs)")
+    await reply(interaction, embed=e, ephemeral=True)
 
-    await interaction.response.send_message(f"✅ Suggestion approuvée et ajoutée: `{s['key']}`", ephemeral=True)
+def fmt_ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+@bot.tree.command(name="ruling_pool", description="(Admin) Saturation du pool Postgres et latences des requêtes.")
+@perf.timed("cmd.ruling_pool")
+async def ruling_pool(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    sat = db_metrics.saturation()
+    p50, p95, p99 = db_metrics.acquire.percentiles(50, 95, 99)
+    e = discord.Embed(title="🐘 Pool Postgres")
+    e.add_field(
+        name="Connexions",
+        value=f"{sat.get('busy', 0)} occupées / {sat.get('size', 0)} ouvertes / {sat.get('max', 0)} max • "
+              f"en attente: {sat.get('waiting', 0)} (pic {sat.get('max_waiting', 0)}) • "
+              f"timeouts: {db_metrics.acquire_timeouts}",
+        inline=False
+    )
+    e.add_field(
+        name="Attente acquire (ms)",
+        value=f"p50 {fmt_ms(p50)} • p95 {fmt_ms(p95)} • p99 {fmt_ms(p99)} ({db_metrics.acquire.count} acquisitions)",
+        inline=False
+    )
+    lines = []
+    for name, hist in sorted(db_metrics.queries.items()):
+        q50, q95, q99 = hist.percentiles(50, 95, 99)
+        lines.append(f"`{name}`: p50 {fmt_ms(q50)} • p95 {fmt_ms(q95)} • p99 {fmt_ms(q99)} ms (n={hist.count})")
+    e.add_field(name="Requêtes préparées", value="\n".join(lines)[:1024] or "Aucune mesure.", inline=False)
+    await reply(interaction, embed=e, ephemeral=True)
+
+@bot.tree.command(name="ruling_perf", description="(Admin) Percentiles de latence par étape (commandes, db_*, Discord).")
+@perf.timed("cmd.ruling_perf")
+async def ruling_perf(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+    e = discord.Embed(title="⏱️ Latences (ms) — p50 / p95 / p99")
+    groups = [
+        ("Commandes", {k: h for k, h in perf.stages.items() if k.startswith("cmd.")}),
+        ("Étapes", {k: h for k, h in perf.stages.items() if not k.startswith("cmd.")}),
+        ("Pool", {"acquire": db_metrics.acquire}),
+    ]
+    for title, hists in groups:
+        lines = []
+        for name, hist in sorted(hists.items()):
+            if not hist.count:
+                continue
+            p50, p95, p99 = hist.percentiles(50, 95, 99)
+            lines.append(f"`{name}` {fmt_ms(p50)} / {fmt_ms(p95)} / {fmt_ms(p99)} (n={hist.count})")
+        e.add_field(name=title, value="\n".join(lines)[:1024] or "Aucune mesure.", inline=False)
+    e.set_footer(text=f"Fenêtre: {PERF_WINDOW} dernières mesures par étape")
+    await reply(interaction, embed=e, ephemeral=True)
+
+@bot.tree.command(name="ruling_import", description="(Admin) Importe un fichier JSON/JSONL de rulings (dossier data/).")
+@app_commands.describe(
+    path="Chemin du fichier, relatif au dossier d'import (ex: rulings.json)",
+    dry_run="N'écrit rien, affiche seulement le diff"
+)
+@perf.timed("cmd.ruling_import")
+@needs_db()
+async def ruling_import(interaction: discord.Interaction, path: str = "rulings.json", dry_run: bool = True):
+    if not is_admin(interaction):
+        await reply(interaction, "Commande réservée aux admins.", ephemeral=True)
+        return
+
+    full = os.path.abspath(os.path.join(IMPORT_DIR, path))
+    if os.path.commonpath([full, IMPORT_DIR]) != IMPORT_DIR or not os.path.isfile(full):
+        await reply(interaction, f"❌ Fichier introuvable: `{path}`", ephemeral=True)
+        return
+
+    await defer(interaction, ephemeral=True)
+    try:
+        report = await import_rulings(full, dry_run=dry_run)
+    except (ValueError, OSError) as e:
+        await reply(interaction, f"❌ Import impossible: {e}", ephemeral=True)
+        return
+    await reply(interaction, format_import_report(report, dry_run)[:2000], ephemeral=True)
 
 # ----------------------------
 # Main
 # ----------------------------
 async def main():
-    await startup()
-    await bot.start(DISCORD_TOKEN)
+    if not DISCORD_TOKEN:
+        raise RuntimeError("DISCORD_TOKEN manquant (Railway > Variables).")
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass
+    # Gateway Discord et initialisation DB en parallèle
+    bot_task = asyncio.create_task(bot.start(DISCORD_TOKEN))
+    try:
+        await startup()
+        await bot_task
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        await shutdown()
+
+async def cli_import(path: str, dry_run: bool, batch_size: int):
+    global pool
+    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=2)
+    try:
+        await db_init()
+        report = await import_rulings(path, dry_run=dry_run, batch_size=batch_size)
+        print(format_import_report(report, dry_run))
+    finally:
+        await pool.close()
+
+def shard_ranges(shard_count: int, workers: int) -> List[List[int]]:
+    """Découpe 0..shard_count-1 en `workers` plages contiguës."""
+    base, extra = divmod(shard_count, workers)
+    out, start = [], 0
+    for i in range(workers):
+        n = base + (1 if i < extra else 0)
+        out.append(list(range(start, start + n)))
+        start += n
+    return [r for r in out if r]
+
+async def supervise():
+    """
+    Lance WORKER_PROCESSES process bot (python main.py run), chacun avec sa plage de
+    shards et son propre pool, et les relance s'ils s'arrêtent (backoff exponentiel).
+    """
+    if not DISCORD_TOKEN:
+        raise RuntimeError("DISCORD_TOKEN manquant (Railway > Variables).")
+    workers = max(1, WORKER_PROCESSES)
+    shard_count = SHARD_COUNT or (workers if workers > 1 else 0)
+    ranges = shard_ranges(shard_count, workers) if shard_count else [[]]
+    procs: Dict[int, asyncio.subprocess.Process] = {}
+    stopping = asyncio.Event()
+
+    def stop():
+        stopping.set()
+        for p in procs.values():
+            if p.returncode is None:
+                p.send_signal(signal.SIGTERM)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop)
+        except NotImplementedError:
+            pass
+
+    async def run_worker(i: int, ids: List[int]):
+        env = dict(os.environ, WORKER_INDEX=str(i))
+        if ids:
+            env["SHARD_COUNT"] = str(shard_count)
+            env["SHARD_IDS"] = ",".join(map(str, ids))
+        if DB_POOL_MAX_TOTAL:
+            env["DB_POOL_MAX"] = str(max(2, DB_POOL_MAX_TOTAL // len(ranges)))
+            env["DB_POOL_MIN"] = str(min(DB_POOL_MIN, int(env["DB_POOL_MAX"])))
+        delay = 1.0
+        while not stopping.is_set():
+            started = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), "run", env=env)
+            procs[i] = proc
+            print(f"🧩 Worker {i} démarré (pid={proc.pid}, shards={ids or 'auto'})")
+            code = await proc.wait()
+            if stopping.is_set():
+                return
+            if time.monotonic() - started > 60:
+                delay = 1.0
+            print(f"⚠️ Worker {i} arrêté (code {code}), relance dans {delay:.0f} s")
+            try:
+                await asyncio.wait_for(stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, 60.0)
+
+    await asyncio.gather(*(run_worker(i, ids) for i, ids in enumerate(ranges)))
+
+def cli():
+    parser = argparse.ArgumentParser(description="YGO rulings bot")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("run", help="Lance le bot (défaut)")
+    sub.add_parser("supervise", help="Lance et surveille WORKER_PROCESSES process bot (sharding)")
+    p_import = sub.add_parser("import", help="Importe un fichier JSON/JSONL de rulings")
+    p_import.add_argument("path")
+    p_import.add_argument("--dry-run", action="store_true", help="n'écrit rien, affiche le diff")
+    p_import.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        asyncio.run(cli_import(args.path, args.dry_run, args.batch_size))
+    elif args.command == "supervise":
+        asyncio.run(supervise())
+    else:
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    cli()